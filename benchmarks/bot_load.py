@@ -0,0 +1,105 @@
+"""
+Load benchmark of Bot against the local fake discord server.
+
+    $ python -m benchmarks.bot_load --events 20000 --interactions 0.05
+
+Reports the events per second the bot dispatches, the p50/p99 latency of
+interactions (from the server sending INTERACTION_CREATE until it receives the
+callback) and the share of REST requests answered with 429.
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import diskordpie
+
+from .fake_discord import FakeDiscord, mixed_events
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def run(events: int, interaction_ratio: float, rate: float, global_limit: int) -> dict:
+    server = FakeDiscord(global_limit=global_limit)
+    await server.start()
+
+    bot = diskordpie.Bot(api_url=server.api_url)
+
+    @bot.slash_command(description="Ping it baby!")
+    async def ping(interaction, thing: str):
+        await interaction.respond(thing)
+
+    bot_task = asyncio.create_task(bot.start("fake-token"))
+    try:
+        await asyncio.wait_for(server.wait_identified(), 10)
+        # wait for the command to be registered before sending interactions
+        while "ping" not in server.commands or ping._id is None:
+            await asyncio.sleep(0.01)
+
+        dispatched = lambda: sum(bot.metrics.events.get(t) for t in ("MESSAGE_CREATE", "INTERACTION_CREATE"))
+        before = dispatched()
+        requests_before = server.requests
+
+        stream = mixed_events(events, server.commands["ping"], interaction_ratio,
+                              options=[ { "name": "thing", "type": 3, "value": "pong" } ])
+        start = time.perf_counter()
+        await server.stream(stream, rate)
+        while dispatched() - before < events:
+            await asyncio.sleep(0.001)
+        elapsed = time.perf_counter() - start
+
+        # let the last callbacks arrive
+        expected = sum(1 for _ in range(0, events, max(int(1 / interaction_ratio), 1))) if interaction_ratio else 0
+        deadline = time.perf_counter() + 30
+        while len(server.interaction_latencies) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+
+        latencies = server.interaction_latencies
+        requests = server.requests - requests_before
+        return {
+            "events": events,
+            "events_per_second": events / elapsed,
+            "interactions": len(latencies),
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "mean_ms": statistics.mean(latencies) * 1000 if latencies else float("nan"),
+            "requests": requests,
+            "rate_limited_ratio": server.rate_limited / requests if requests else 0.0,
+        }
+    finally:
+        bot_task.cancel()
+        try:
+            await bot_task
+        except asyncio.CancelledError:
+            pass
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark of Bot against a fake discord server.")
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--interactions", type=float, default=0.05, help="share of events that are interactions")
+    parser.add_argument("--rate", type=float, default=None, help="events per second, unlimited by default")
+    parser.add_argument("--global-limit", type=int, default=50, help="REST requests per second")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run(args.events, args.interactions, args.rate, args.global_limit))
+
+    print(f"events:            {result['events']}")
+    print(f"events/sec:        {result['events_per_second']:,.0f}")
+    print(f"interactions:      {result['interactions']}")
+    print(f"interaction p50:   {result['p50_ms']:.1f} ms")
+    print(f"interaction p99:   {result['p99_ms']:.1f} ms")
+    print(f"REST requests:     {result['requests']}")
+    print(f"429 rate:          {result['rate_limited_ratio']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Measures the memory used by the entity cache per cached member, guild, channel and role.
+
+    $ python -m benchmarks.cache_memory --members 200000 --guilds 2000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from diskordpie.cache import Cache
+
+
+def member_payload(i: int) -> dict:
+    return {
+        "user": {
+            "id": str(800_000_000_000_000_000 + i),
+            "username": f"user{i}",
+            "discriminator": f"{i % 10000:04}",
+        },
+        "nick": None,
+        "roles": [ str(900_000_000_000_000_000 + i % 7) ],
+        # a distinct string for every member, like the ones decoded from a real payload
+        "joined_at": f"2021-09-28T18:{i // 60 % 60:02}:{i % 60:02}.{i % 1000:03}000+00:00",
+        "pending": False,
+    }
+
+
+def chunk_events(guild_id: str, count: int, chunk_size: int = 1000):
+    for start in range(0, count, chunk_size):
+        yield {
+            "guild_id": guild_id,
+            "members": [ member_payload(i) for i in range(start, min(start + chunk_size, count)) ],
+        }
+
+
+def guild_payload(i: int, channels: int, roles: int) -> dict:
+    guild_id = 600_000_000_000_000_000 + i * 1000
+    return {
+        "id": str(guild_id),
+        "name": f"guild{i}",
+        "icon": "a1b2c3d4e5f60718293a4b5c6d7e8f90",
+        "owner_id": str(800_000_000_000_000_000 + i),
+        "member_count": 100,
+        "features": [ "COMMUNITY", "NEWS" ],
+        "channels": [ {
+            "id": str(guild_id + 1 + c),
+            "type": 0,
+            "name": f"channel-{c}",
+            "position": c,
+            "topic": None,
+        } for c in range(channels) ],
+        "roles": [ {
+            "id": str(guild_id + 500 + r),
+            "name": f"role-{r}",
+            "color": 0,
+            "position": r,
+            "permissions": "1071698660929",
+        } for r in range(roles) ],
+    }
+
+
+def measure_guilds(guilds: int, channels: int, roles: int) -> None:
+    """Memory of guilds, channels and roles, each type measured on its own."""
+    payloads = [ guild_payload(i, channels, roles) for i in range(guilds) ]
+    bare = [ dict(payload, channels=[], roles=[]) for payload in payloads ]
+
+    def used_by(cache: Cache, events) -> int:
+        gc.collect()
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        for payload in events:
+            cache.apply("GUILD_CREATE", payload)
+        gc.collect()
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return used - base
+
+    only_guilds = used_by(Cache(channels=False, roles=False, members=False, users=False), bare)
+    with_channels = used_by(Cache(roles=False, members=False, users=False),
+                            [ dict(payload, roles=[]) for payload in payloads ])
+    with_roles = used_by(Cache(channels=False, members=False, users=False),
+                         [ dict(payload, channels=[]) for payload in payloads ])
+
+    print(f"guilds cached:     {guilds} ({channels} channels, {roles} roles each)")
+    print(f"bytes per guild:   {only_guilds / guilds:.0f}")
+    # includes the growth of the guild's channel_ids / role_ids index
+    print(f"bytes per channel: {(with_channels - only_guilds) / (guilds * channels):.0f}")
+    print(f"bytes per role:    {(with_roles - only_guilds) / (guilds * roles):.0f}")
+
+
+def run(members: int) -> None:
+    cache = Cache(members=None, users=None)
+    guild_id = "700000000000000000"
+    roles = [ { "id": str(900_000_000_000_000_000 + r), "name": f"role-{r}" } for r in range(7) ]
+    cache.apply("GUILD_CREATE", { "id": guild_id, "name": "bench", "member_count": members, "roles": roles })
+
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+
+    start = time.perf_counter()
+    for chunk in chunk_events(guild_id, members):
+        cache.apply("GUILD_MEMBERS_CHUNK", chunk)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = used - base
+    print(f"members cached:   {len(cache.members)}")
+    print(f"users cached:     {len(cache.users)}")
+    print(f"total memory:     {total / 2**20:.1f} MiB")
+    # includes the guild's member_ids index
+    print(f"bytes per member: {total / members:.0f} (member + user)")
+    print(f"apply rate:       {members / elapsed:,.0f} members/s")
+
+    start = time.perf_counter()
+    for i in range(members):
+        cache.get_member(guild_id, str(800_000_000_000_000_000 + i))
+    elapsed = time.perf_counter() - start
+    print(f"lookup time:      {elapsed / members * 1e9:.0f} ns")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--guilds", type=int, default=2_000)
+    parser.add_argument("--channels", type=int, default=20, help="channels per guild")
+    parser.add_argument("--roles", type=int, default=10, help="roles per guild")
+    args = parser.parse_args()
+    run(args.members)
+    print()
+    measure_guilds(args.guilds, args.channels, args.roles)
@@ -0,0 +1,389 @@
+"""
+A local stand-in for the discord gateway and REST api.
+
+It speaks enough of the gateway protocol for `Bot` to connect, identify, resume
+and be told to reconnect, streams synthetic or recorded events at a configurable
+rate and answers REST requests with discord-like rate limit headers and 429s.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import time
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web, WSMsgType
+
+from diskordpie.gateway import OpCode, CloseCode
+from diskordpie.recording import read_recording
+from diskordpie.utils import DISCORD_EPOCH
+
+_logger = logging.getLogger(__name__)
+
+APPLICATION_ID = "900000000000000001"
+BOT_USER_ID = "900000000000000002"
+GUILD_ID = "900000000000000003"
+CHANNEL_ID = "900000000000000004"
+
+
+def make_snowflake(worker: int = 0) -> str:
+    make_snowflake.increment = (make_snowflake.increment + 1) & 0xFFF
+    return str(((int(time.time() * 1000) - DISCORD_EPOCH) << 22) | (worker << 17) | make_snowflake.increment)
+
+make_snowflake.increment = 0
+
+
+class RateLimit:
+    """A fixed window limit like the ones discord uses for its buckets."""
+
+    def __init__(self, limit: int, period: float) -> None:
+        self.limit = limit
+        self.period = period
+        self.remaining = limit
+        self.reset_at = time.monotonic() + period
+
+    def hit(self) -> bool:
+        now = time.monotonic()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.period
+        if self.remaining == 0:
+            return False
+        self.remaining -= 1
+        return True
+
+    @property
+    def reset_after(self) -> float:
+        return max(self.reset_at - time.monotonic(), 0.0)
+
+
+class FakeSession:
+
+    def __init__(self, session_id: str, buffer_size: int) -> None:
+        self.id = session_id
+        self.seq = 0
+        # sent dispatches kept for replaying on resume
+        self.sent = deque(maxlen=buffer_size)
+
+
+class FakeDiscord:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *, heartbeat_interval: int = 41250,
+                 bucket_limit: int = 5, bucket_period: float = 1.0, global_limit: int = 50,
+                 resume_buffer: int = 10_000) -> None:
+        self.host = host
+        self.port = port
+        self.heartbeat_interval = heartbeat_interval
+        self.bucket_limit = bucket_limit
+        self.bucket_period = bucket_period
+        self.global_limit = global_limit
+
+        self._resume_buffer = resume_buffer
+        self._runner = None
+        self._sessions: Dict[str, FakeSession] = {}
+        self._sockets = set()
+        # like discord's, the limits are kept per token
+        self._buckets: Dict[Tuple[str, str], RateLimit] = {}
+        self._globals: Dict[str, RateLimit] = {}
+        self._session_ids = itertools.count(1)
+        # every token gets its own bot user, the first one is BOT_USER_ID
+        self._user_ids: Dict[str, str] = {}
+        self._identified = asyncio.Event()
+
+        # registered commands by name
+        self.commands: Dict[str, dict] = {}
+
+        # statistics
+        self.requests = 0
+        self.rate_limited = 0
+        self.heartbeats = 0
+        # interaction id -> time its INTERACTION_CREATE was sent
+        self._interactions_sent: Dict[str, float] = {}
+        self.interaction_latencies: List[float] = []
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/v9"
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/gateway", self._gateway)
+        app.router.add_route("*", "/api/v9/{path:.*}", self._rest)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # pick up the real port when an ephemeral one was requested
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        for ws in list(self._sockets):
+            await ws.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def wait_identified(self) -> None:
+        await self._identified.wait()
+
+    # ---- gateway ----
+
+    async def dispatch(self, event_type: str, data: dict) -> None:
+        """Sends an event to every connected client."""
+        if event_type == "INTERACTION_CREATE":
+            self._interactions_sent[data["id"]] = time.perf_counter()
+        for ws in list(self._sockets):
+            await self._send_dispatch(ws, event_type, data)
+
+    async def stream(self, events: Iterable[dict], rate: Optional[float] = None) -> int:
+        """
+        Dispatches the events, each a dict with "t" and "d" keys, at `rate` events
+        per second or as fast as possible. Returns the number of events sent.
+        """
+        sent = 0
+        start = time.perf_counter()
+        for event in events:
+            if rate:
+                delay = start + sent / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.dispatch(event["t"], event["d"])
+            sent += 1
+            # let the bot have the loop even when we stream as fast as possible
+            if sent % 64 == 0:
+                await asyncio.sleep(0)
+        return sent
+
+    async def request_reconnect(self) -> None:
+        for ws in list(self._sockets):
+            await ws.send_json({ "op": OpCode.RECONNECT, "d": None })
+
+    async def invalidate_session(self, resumable: bool = False) -> None:
+        for ws in list(self._sockets):
+            await ws.send_json({ "op": OpCode.INVALID_SESSION, "d": resumable })
+
+    async def close_connections(self, code: int = CloseCode.UNKNOWN_ERROR) -> None:
+        for ws in list(self._sockets):
+            await ws.close(code=code)
+
+    async def _send_dispatch(self, ws, event_type: str, data: dict) -> None:
+        session = ws._fake_session
+        if session is None:
+            return
+        session.seq += 1
+        payload = { "op": OpCode.DISPATCH, "t": event_type, "s": session.seq, "d": data }
+        session.sent.append(payload)
+        await ws.send_str(json.dumps(payload))
+
+    async def _gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        ws._fake_session = None
+        self._sockets.add(ws)
+
+        await ws.send_json({ "op": OpCode.HELLO, "d": { "heartbeat_interval": self.heartbeat_interval } })
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(msg.data)
+                except ValueError:
+                    await ws.close(code=CloseCode.DECODE_ERROR)
+                    break
+                await self._handle_op(ws, data)
+        finally:
+            self._sockets.discard(ws)
+        return ws
+
+    async def _handle_op(self, ws, data: dict) -> None:
+        op = data.get("op")
+
+        if op == OpCode.HEARTBEAT:
+            self.heartbeats += 1
+            await ws.send_json({ "op": OpCode.HEARTBEAT_ACK })
+        elif op == OpCode.IDENTIFY:
+            if ws._fake_session is not None:
+                await ws.close(code=CloseCode.ALREADY_AUTHENTICATED)
+                return
+            session = FakeSession(f"session-{next(self._session_ids)}", self._resume_buffer)
+            self._sessions[session.id] = session
+            ws._fake_session = session
+            await self._send_dispatch(ws, "READY", self._ready_payload(session, data["d"]["token"]))
+            await self._send_dispatch(ws, "GUILD_CREATE", { "id": GUILD_ID, "name": "fake guild", "member_count": 1 })
+            self._identified.set()
+        elif op == OpCode.RESUME:
+            session = self._sessions.get(data["d"]["session_id"])
+            if session is None:
+                await ws.send_json({ "op": OpCode.INVALID_SESSION, "d": False })
+                return
+            ws._fake_session = session
+            last_seq = data["d"]["seq"] or 0
+            for payload in list(session.sent):
+                if payload["s"] > last_seq:
+                    await ws.send_str(json.dumps(payload))
+            await self._send_dispatch(ws, "RESUMED", {})
+        elif op == OpCode.REQUEST_GUILD_MEMBERS:
+            await self._send_dispatch(ws, "GUILD_MEMBERS_CHUNK", {
+                "guild_id": data["d"]["guild_id"],
+                "members": [],
+                "chunk_index": 0,
+                "chunk_count": 1,
+                "nonce": data["d"].get("nonce"),
+            })
+        elif op is None or op not in OpCode.__members__.values():
+            await ws.close(code=CloseCode.UNKNOWN_OPCODE)
+
+    def _ready_payload(self, session: FakeSession, token: str) -> dict:
+        user_id = self._user_ids.get(token)
+        if user_id is None:
+            user_id = self._user_ids[token] = str(int(BOT_USER_ID) + (len(self._user_ids) << 22))
+        return {
+            "v": 9,
+            "session_id": session.id,
+            "user": { "id": user_id, "username": "fake-bot", "discriminator": "0001", "bot": True },
+            "application": { "id": APPLICATION_ID, "flags": 0 },
+            "guilds": [ { "id": GUILD_ID, "unavailable": True } ],
+        }
+
+    # ---- rest ----
+
+    async def _rest(self, request):
+        self.requests += 1
+        route = f"{request.method}:/{request.match_info['path']}"
+        token = request.headers.get("Authorization", "")
+
+        global_limit = self._globals.get(token)
+        if global_limit is None:
+            global_limit = self._globals[token] = RateLimit(self.global_limit, 1.0)
+        if not global_limit.hit():
+            self.rate_limited += 1
+            retry_after = global_limit.reset_after
+            return web.json_response(
+                { "message": "You are being rate limited.", "retry_after": retry_after, "global": True },
+                status=429,
+                headers={ "X-RateLimit-Global": "true", "X-RateLimit-Scope": "global", "Retry-After": str(retry_after) },
+            )
+
+        bucket = self._buckets.get((token, route))
+        if bucket is None:
+            bucket = self._buckets[token, route] = RateLimit(self.bucket_limit, self.bucket_period)
+        allowed = bucket.hit()
+
+        headers = {
+            "X-RateLimit-Limit": str(bucket.limit),
+            "X-RateLimit-Remaining": str(bucket.remaining),
+            "X-RateLimit-Reset": str(time.time() + bucket.reset_after),
+            "X-RateLimit-Reset-After": f"{bucket.reset_after:.3f}",
+            "X-RateLimit-Bucket": hashlib.md5(route.encode()).hexdigest(),
+        }
+
+        if not allowed:
+            self.rate_limited += 1
+            headers["X-RateLimit-Scope"] = "user"
+            return web.json_response(
+                { "message": "You are being rate limited.", "retry_after": bucket.reset_after, "global": False },
+                status=429,
+                headers=headers,
+            )
+
+        return await self._handle_route(request, headers)
+
+    async def _handle_route(self, request, headers):
+        path = request.match_info["path"].split("/")
+
+        if request.method == "GET" and path == [ "gateway", "bot" ]:
+            return web.json_response({
+                "url": f"ws://{self.host}:{self.port}/gateway",
+                "shards": 1,
+                "session_start_limit": { "total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1 },
+            }, headers=headers)
+
+        if request.method == "GET" and path == [ "oauth2", "applications", "@me" ]:
+            return web.json_response({ "id": APPLICATION_ID, "name": "fake-app", "flags": 0 }, headers=headers)
+
+        if path[0] == "applications" and path[2:] == [ "commands" ]:
+            if request.method == "POST":
+                return web.json_response(self._register_command(await request.json()), headers=headers)
+            if request.method == "PUT":
+                commands = [ self._register_command(cmd) for cmd in await request.json() ]
+                return web.json_response(commands, headers=headers)
+
+        if request.method == "POST" and path[0] == "interactions" and path[3:] == [ "callback" ]:
+            sent_at = self._interactions_sent.pop(path[1], None)
+            if sent_at is not None:
+                self.interaction_latencies.append(time.perf_counter() - sent_at)
+            return web.Response(status=204, headers=headers)
+
+        return web.json_response({ "message": "404: Not Found", "code": 0 }, status=404, headers=headers)
+
+    def _register_command(self, cmd: dict) -> dict:
+        existing = self.commands.get(cmd["name"])
+        cmd = dict(cmd, id=existing["id"] if existing else make_snowflake(), application_id=APPLICATION_ID)
+        self.commands[cmd["name"]] = cmd
+        return cmd
+
+
+# ---- synthetic events ----
+
+def message_create(content: str = "hello") -> dict:
+    return {
+        "t": "MESSAGE_CREATE",
+        "d": {
+            "id": make_snowflake(),
+            "channel_id": CHANNEL_ID,
+            "guild_id": GUILD_ID,
+            "content": content,
+            "author": { "id": "900000000000000010", "username": "someone", "discriminator": "1234" },
+        },
+    }
+
+def interaction_create(command: dict, options: Optional[List[dict]] = None) -> dict:
+    return {
+        "t": "INTERACTION_CREATE",
+        "d": {
+            "id": make_snowflake(),
+            "application_id": APPLICATION_ID,
+            "type": 2,
+            "token": "fake-interaction-token",
+            "version": 1,
+            "guild_id": GUILD_ID,
+            "channel_id": CHANNEL_ID,
+            "member": { "user": { "id": "900000000000000010", "username": "someone", "discriminator": "1234" } },
+            "data": {
+                "id": command["id"],
+                "name": command["name"],
+                "type": 1,
+                "options": options or [],
+            },
+        },
+    }
+
+def mixed_events(count: int, command: dict, interaction_ratio: float = 0.1, options=None) -> Iterable[dict]:
+    """MESSAGE_CREATEs with an INTERACTION_CREATE mixed in every 1/interaction_ratio events."""
+    every = max(int(1 / interaction_ratio), 1) if interaction_ratio else 0
+    for i in range(count):
+        if every and i % every == 0:
+            yield interaction_create(command, options)
+        else:
+            yield message_create()
+
+def load_jsonl(path: str) -> Iterable[dict]:
+    """Dispatch payloads stored one per line, as saved from a gateway connection."""
+    with open(path) as f:
+        for line in f:
+            payload = json.loads(line)
+            if payload.get("op") == OpCode.DISPATCH:
+                yield payload
+
+
+def load_recording(paths) -> Iterable[dict]:
+    """Dispatch payloads of a `GatewayRecorder` recording."""
+    for _, frame in read_recording(paths):
+        payload = json.loads(frame)
+        if payload.get("op") == OpCode.DISPATCH:
+            yield payload
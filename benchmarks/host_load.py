@@ -0,0 +1,75 @@
+"""
+Runs many bots in one `BotHost` against the local fake discord server.
+
+    $ python -m benchmarks.host_load --bots 50 --idle 10
+
+Reports how long it took until every bot was ready, the peak memory of the
+process and the CPU time the host used while the bots were idle.
+"""
+import argparse
+import asyncio
+import logging
+import resource
+import time
+
+import diskordpie
+
+from .fake_discord import FakeDiscord
+
+
+async def run(bots: int, idle: float) -> dict:
+    server = FakeDiscord(heartbeat_interval=1000)
+    await server.start()
+
+    host = diskordpie.BotHost()
+    for i in range(bots):
+        bot = host.bot(api_url=server.api_url)
+
+        @bot.slash_command(description="Ping it baby!")
+        async def ping(interaction, thing: str):
+            await interaction.respond(thing)
+
+        host.add(bot, f"fake-token-{i}")
+
+    start = time.perf_counter()
+    serve = asyncio.create_task(host.serve())
+    try:
+        while sum(bot.metrics.events.get("READY") for bot in host.bots) < bots:
+            await asyncio.sleep(0.01)
+        ready = time.perf_counter() - start
+
+        cpu_before = time.process_time()
+        await asyncio.sleep(idle)
+        cpu = time.process_time() - cpu_before
+
+        return {
+            "bots": bots,
+            "all_ready_s": ready,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "idle_cpu": cpu / idle,
+            "heartbeats": server.heartbeats,
+        }
+    finally:
+        await host.close()
+        await serve
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many bots in one host against a fake discord server.")
+    parser.add_argument("--bots", type=int, default=50)
+    parser.add_argument("--idle", type=float, default=10.0, help="seconds to measure the idle cpu usage for")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    result = asyncio.run(run(args.bots, args.idle))
+
+    print(f"bots:              {result['bots']}")
+    print(f"all ready after:   {result['all_ready_s']:.2f} s")
+    print(f"max rss:           {result['max_rss_mb']:.1f} MB")
+    print(f"idle cpu:          {result['idle_cpu']:.2%}")
+    print(f"heartbeats:        {result['heartbeats']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Replays a gateway recording through the bot without any network access.
+
+    $ python -m benchmarks.replay "recordings/gateway.*.dprec" --profile replay.prof
+
+Every recorded frame is decoded by `Gateway.next_event` and dispatched by
+`Bot._dispatch_event` exactly like live traffic, REST requests are answered by an
+offline client. Use `--speed` to keep the recorded pacing, and `--profile` to
+write cProfile stats of the run.
+"""
+import argparse
+import asyncio
+import cProfile
+import logging
+import pstats
+
+import diskordpie
+
+from diskordpie.recording import replay
+
+
+def make_bot() -> diskordpie.Bot:
+    bot = diskordpie.Bot()
+
+    @bot.slash_command(description="Ping it baby!")
+    async def ping(interaction, thing: str):
+        await interaction.respond(thing)
+
+    return bot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a gateway recording through the bot.")
+    parser.add_argument("paths", nargs="+", help="recording files or glob patterns")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="replay at the recorded pace times SPEED, as fast as possible by default")
+    parser.add_argument("--profile", metavar="FILE", default=None, help="write cProfile stats to FILE")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    bot = make_bot()
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    stats = asyncio.run(replay(bot, args.paths, args.speed))
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    print(f"frames:            {stats.frames}")
+    print(f"events:            {stats.events}")
+    print(f"elapsed:           {stats.elapsed:.3f} s")
+    print(f"events/sec:        {stats.events_per_second:,.0f}")
+    if profiler:
+        print()
+        pstats.Stats(args.profile).sort_stats("cumulative").print_stats(15)
+
+
+if __name__ == "__main__":
+    main()
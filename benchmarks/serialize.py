@@ -0,0 +1,80 @@
+"""
+Compares the compiled serializers against the old reflective utils.to_json.
+
+    $ python -m benchmarks.serialize --iterations 20000
+"""
+import argparse
+import inspect
+import json
+import timeit
+
+from diskordpie.commands import SlashCommand, Option, Choice
+from diskordpie.utils import to_json
+
+
+def _attributes(obj):
+    if hasattr(obj, "__dict__"):
+        return obj.__dict__
+    slots = [ s for cls in type(obj).__mro__ for s in getattr(cls, "__slots__", ()) ]
+    return { s: getattr(obj, s) for s in slots if hasattr(obj, s) }
+
+def reflective_to_dict(obj):
+    # utils.to_dict as it was before the serializers were compiled,
+    # extended to read __slots__ so it works with the current entities
+    res = {}
+    attrs = _attributes(obj)
+
+    for k in attrs:
+        if k.startswith("_") or k.endswith("_"):
+            continue
+
+        thing = attrs[k]
+        if inspect.ismethod(thing):
+            continue
+
+        if isinstance(thing, list):
+            arr = []
+            for val in thing:
+                if inspect.isbuiltin(val):
+                    arr.append(val)
+                else:
+                    arr.append(reflective_to_dict(val))
+            res[k] = arr
+            continue
+
+        module = inspect.getmodule(thing)
+        if module and module.__name__.startswith("diskordpie"):
+            thing = reflective_to_dict(thing)
+
+        res[k] = thing
+
+    return res
+
+def reflective_to_json(obj):
+    return json.dumps(reflective_to_dict(obj))
+
+
+def make_command() -> SlashCommand:
+    async def roll(interaction, sides: int, times: int, label: str, secret: bool, scale: float):
+        pass
+
+    options = {
+        "sides": Option.Range(2, 100),
+        "label": Option(choices=[ Choice(f"choice {i}", f"value {i}") for i in range(10) ]),
+    }
+    return SlashCommand(roll, description="Roll some dice.", options=options)
+
+
+def run(iterations: int) -> None:
+    cmd = make_command()
+
+    for name, func in [ ("reflective to_json", reflective_to_json), ("compiled to_json", to_json) ]:
+        seconds = timeit.timeit(lambda: func(cmd), number=iterations)
+        print(f"{name:20} {seconds / iterations * 1e6:8.1f} us per command")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+    run(args.iterations)
@@ -1,2 +1,5 @@
 from .bot import *
 from .commands import *
+from .cache import *
+from .host import *
+from .gateway import Intents
@@ -1,8 +1,11 @@
-import json
+import logging
 
 from .http import HttpClient
 from .commands import SlashCommand
 from .entities import Application
+from .utils import to_dict
+
+_logger = logging.getLogger(__name__)
 
 class DiscordAPI:
 
@@ -12,29 +15,12 @@ class DiscordAPI:
 
     async def create_slash_command(self, cmd: SlashCommand) -> SlashCommand:
         url = f"/applications/{self._app.id}/commands"
-        payload = {
-            "name": cmd.name,
-            "description": cmd.description,
-            "options": [],
-        }
-
-        for opt in cmd.options:
-            assert opt.type is not None
-            opt_data = {
-                "type": opt.type,
-                "name": opt.name,
-                "description": opt.description,
-                "required": opt.required,
-                "min_value": opt.min_value,
-                "max_value": opt.max_value,
-            }
-            payload["options"].append(opt_data)
-        
-        print("creating cmd: ")
-        print(json.dumps(payload, indent=4))
+        payload = to_dict(cmd)
+
+        _logger.debug(f"Creating command {cmd.name}: {payload}")
 
         resp = await self._http.post(url, payload)
 
-        cmd._id = resp["id"]
+        cmd._id = int(resp["id"])
 
         return cmd
@@ -1,47 +1,97 @@
+import time
+
+# measured for the startup report
+_import_started = time.perf_counter()
+
 import asyncio
-import asyncio
-import aiohttp
 import logging
 import signal
 
+from typing import TYPE_CHECKING
+
 from .http import HttpClient
 from .gateway import (
     GatewayDisconnected, 
     Gateway, 
     ReconnectGateway,
     GatewayEvent,
+    Intents,
 )
 from .commands import SlashCommand, Interaction
 from .entities import User, Application
 from .api import DiscordAPI
+from .cache import Cache
+from .members import MemberChunker, MemberStream
+from .events import EventRegistry
+from .tracing import Tracer, InteractionTrace
+from .metrics import MetricsRegistry, MetricsServer, BotMetrics, LoopLagMonitor
+from .recording import GatewayRecorder
+from .watchdog import LoopWatchdog
+from .startup import StartupReport
+
+if TYPE_CHECKING:
+    import aiohttp
 
 __all__ = [ "Bot" ]
 
+_import_time = time.perf_counter() - _import_started
+
 _logger = logging.getLogger(__name__)
 
 
+def _event_type_of(func) -> str:
+    if not func.__name__.startswith("on_"):
+        raise ValueError("Event listener names have to start with 'on_'.")
+    return func.__name__[3:].upper()
+
+
 class Bot:
 
-    def __init__(self):
+    def __init__(self, *, intents: Intents = Intents.DEFAULT, cache: Cache = None, tracer: Tracer = None,
+                 metrics: MetricsRegistry = None, metrics_port: int = None, api_url: str = None,
+                 recorder: GatewayRecorder = None, watchdog: LoopWatchdog = None, name: str = None,
+                 monitor_loop: bool = True):
+        self._intents = intents
+        self._recorder = recorder
+        self._api_url = api_url
         self._session_id = None
         self._http_session = None
+        self._owns_session = True
         self._http = None
         self._gateway = None
         self._commands = []
+        self._commands_by_name = {}
         self._api = None
         self._main_task = None
+        self._chunker = None
+        self._events = EventRegistry()
+        self._metrics_port = metrics_port
+        self._metrics_server = None
+        self._lag_monitor = None
+        # a host running many bots on one loop monitors the loop only once
+        self._monitor_loop = monitor_loop
+        self._watchdog = watchdog
+        # set by run, which prints the startup report instead of only logging it
+        self._print_startup = False
 
         self.user = None
         self.app = None
+        self.startup = None
+        self.cache = cache if cache is not None else Cache()
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.metrics = BotMetrics(metrics if metrics is not None else MetricsRegistry(), name)
+        if watchdog is not None and watchdog.metrics is None:
+            watchdog.metrics = self.metrics
 
     def run(self, token: str):
         loop = asyncio.get_event_loop()
 
         # make sure all resources are released when the bot is closed with ctrl-c
         loop.add_signal_handler(signal.SIGINT, self._on_signal)
+        self._print_startup = True
         
         try:
-            self._main_task = loop.create_task( self._run(token) )
+            self._main_task = loop.create_task( self.start(token), name="bot main loop" )
             loop.run_until_complete(self._main_task)
         except asyncio.CancelledError:
             _logger.info("Main task was cancelled.")
@@ -50,31 +100,71 @@ class Bot:
 
     async def _shutdown(self):
         _logger.info("Stopping the bot.")
+        self._events.cancel_all()
+        if self._lag_monitor:
+            await self._lag_monitor.stop()
+        if self._watchdog:
+            await self._watchdog.stop()
+        if self._metrics_server:
+            await self._metrics_server.close()
         if self._gateway:
             await self._gateway.close()
-        if self._http_session:
+        if self._recorder:
+            # waits for the writer thread to drain its queue
+            await asyncio.get_running_loop().run_in_executor(None, self._recorder.close)
+        if self._http_session and self._owns_session:
             await self._http_session.close()
+        self._http_session = None
 
     def _on_signal(self):
         _logger.info("Received a signal - cancelling the main task.")
         if self._main_task:
             self._main_task.cancel()
 
-    async def _run(self, token: str):
+    async def start(self, token: str, session: "aiohttp.ClientSession" = None):
+        """
+        Runs the bot on the current event loop until it disconnects or the task is cancelled.
+
+        A `session` given here is used for both REST and the gateway and is left open
+        when the bot stops, so several bots can share its connection pool.
+        """
         try:
-            await self._main_loop(token)
+            await self._main_loop(token, session)
         finally:
             await self._shutdown()
 
-    async def _main_loop(self, token: str):
+    async def _main_loop(self, token: str, session: "aiohttp.ClientSession" = None):
+        # aiohttp is by far the slowest import so it is deferred until the bot starts
+        started = time.perf_counter()
+        import aiohttp
+        self.startup = StartupReport(_import_time + time.perf_counter() - started, started)
+
         # apparently ClientSession has to be created in a coroutine 
         # so let's initialize everything here
-        self._http_session = aiohttp.ClientSession()
-        self._http = HttpClient(self._http_session)
+        self._owns_session = session is None
+        self._http_session = session if session is not None else aiohttp.ClientSession()
+        self._http = HttpClient(self._http_session, self.metrics, self._api_url)
         self._http._token = token
-        self._gateway = Gateway(self._http_session, self._http)
-        
+        self._gateway = Gateway(self._http_session, self._http, self._intents, self.tracer, self.metrics,
+                                self._recorder)
+        self._chunker = MemberChunker(self._gateway, self.cache)
+
+        if self._monitor_loop:
+            self._lag_monitor = LoopLagMonitor(self.metrics)
+            self._lag_monitor.start()
+        if self._watchdog:
+            self._watchdog.start()
+        if self._metrics_port is not None:
+            self._metrics_server = MetricsServer(self.metrics.registry, port=self._metrics_port)
+            await self._metrics_server.start()
+
+        # registering the commands only needs the app id, so it runs alongside connecting
+        # instead of holding up the events after READY
+        if self._commands:
+            self._events.spawn(self._sync_commands(), "command sync")
+
         await self._gateway.connect(token)
+        self._mark_startup(StartupReport.CONNECT)
 
         while True:
             try:
@@ -82,40 +172,72 @@ class Bot:
                 await self._dispatch_event(event)
             except ReconnectGateway as e:
                 _logger.warning(f"Attempting to reconnect: resume={e.resume}.")
+                self.metrics.reconnects.inc(str(e.code) if e.code else "none", "true" if e.resume else "false")
                 await self._gateway.connect(token, resume=e.resume)
             except GatewayDisconnected as e:
                 _logger.error(f"Gateway connection lost forever :(.")
+                self.metrics.disconnects.inc(str(e.code) if e.code else "none")
+                self._chunker.fail_all(e)
                 break
 
     async def _dispatch_event(self, event: GatewayEvent):
+        self.metrics.events.inc(event.type)
+
+        # update the cache first so the handlers below already see the new state
+        self.cache.apply(event.type, event.data)
+
         if event.type == "READY":
             _logger.info(f"Connected to gateway version {event.data['v']} as shard {event.data.get('shard')}")
             self._session_id = event.data["session_id"]
-            self.user = User(**event.data["user"])
-            self.app = Application(**event.data["application"])
+            self.user = User(event.data["user"])
+            self.app = Application(event.data["application"])
             _logger.info(f"Bot user is {self.user.username}")
             _logger.info(f"App is {self.app.id}")
+            if not self.metrics.named:
+                self.metrics.rename(str(self.user.id))
 
             self._api = DiscordAPI(self._http, self.app)
-
-            for cmd in self._commands:
-                await self._api.create_slash_command(cmd)
+            self._mark_startup(StartupReport.READY)
 
         elif event.type == "RESUMED":
-            print("Resuming finished.")
-        elif event.type == "MESSAGE_CREATE":
-            print("Message: " + event.data["content"])  
+            _logger.info("Resuming finished.")
+        elif event.type == "GUILD_MEMBERS_CHUNK":
+            self._chunker.feed(event.data)
         elif event.type == "INTERACTION_CREATE":
             _logger.info(f"Interaction received: {event.data['type']}")
             interaction = Interaction(self._http, event.data)
-            for cmd in self._commands:
-                if cmd._id == interaction._cmd_id:
-                    await self.invoke_command(cmd, interaction)
-        else:
-            print(f"Event received: {event.type}")
-            print(f"{event.data}")
+            if event.received_at is not None:
+                interaction._trace = self.tracer.start(interaction._id, event.received_at, event.decode_time,
+                                                       self.metrics.bot)
+            # by name, the interaction can arrive before the command sync returned the ids
+            cmd = self._commands_by_name.get(interaction._cmd_name)
+            if cmd is not None:
+                self._events.spawn(self.invoke_command(cmd, interaction), f"command {cmd.name}")
+
+        self._events.dispatch(event.type, event.data)
+
+    async def _sync_commands(self):
+        # the app id is known before READY arrives when it's fetched over REST
+        app = Application(await self._http.get("/oauth2/applications/@me"))
+        api = DiscordAPI(self._http, app)
+        await asyncio.gather(*( api.create_slash_command(cmd) for cmd in self._commands ))
+        _logger.info(f"Registered {len(self._commands)} commands.")
+        self._mark_startup(StartupReport.COMMANDS)
+
+    def _mark_startup(self, step: str):
+        if self.startup is None or step in self.startup.steps:
+            return
+        self.startup.mark(step)
+        if self.startup.get(StartupReport.READY) is not None \
+                and (self.startup.get(StartupReport.COMMANDS) is not None or not self._commands):
+            _logger.info(f"Bot is ready: {self.startup}")
+            if self._print_startup:
+                print(self.startup.breakdown(), flush=True)
 
     async def invoke_command(self, cmd: SlashCommand, interaction: Interaction):
+        trace = interaction._trace
+        if trace is not None:
+            trace.mark(InteractionTrace.QUEUE)
         args = {}
 
         for arg in interaction._args:
@@ -127,13 +249,73 @@ class Bot:
             if opt is None:
                 raise Exception("Unknown option in interaction.")
             args[opt._arg_name] = arg.value
-        
-        await cmd.invoke(interaction, **args)
+
+        if trace is None:
+            await cmd.invoke(interaction, **args)
+            return
+
+        trace.command = cmd.name
+        trace.mark(InteractionTrace.ROUTING)
+        try:
+            await cmd.invoke(interaction, **args)
+        finally:
+            # includes the rate limit waits and http round-trips of the requests made by the handler
+            trace.mark(InteractionTrace.HANDLER)
+            self.tracer.finish(trace)
+
+    async def request_members(self, guild_id, *, query: str = "", limit: int = 0,
+                              user_ids=None, presences: bool = False) -> MemberStream:
+        """
+        Requests members of a guild over the gateway, either all of them, those whose
+        username starts with `query` or those with the given ids.
+
+        Requesting all members needs the GUILD_MEMBERS intent.
+        """
+        self._check_started()
+        return await self._chunker.request(guild_id, query=query, limit=limit, user_ids=user_ids, presences=presences)
+
+    def request_members_many(self, guild_ids, *, query: str = "", limit: int = 0,
+                             presences: bool = False, max_pending: int = 5):
+        self._check_started()
+        return self._chunker.request_many(guild_ids, query=query, limit=limit, presences=presences, max_pending=max_pending)
+
+    def _check_started(self):
+        if self._chunker is None:
+            raise RuntimeError("Members can only be requested once the bot was started.")
+
+    def event(self, func):
+        """Registers a listener for the event named by the function, e.g. `on_message_create`."""
+        self._events.add_listener(_event_type_of(func), func)
+        return func
+
+    def listen(self, event_type: str = None):
+        """Registers a listener for `event_type`, or for the event named by the function like `event`."""
+        def dec(func):
+            self._events.add_listener(event_type if event_type else _event_type_of(func), func)
+            return func
+        return dec
+
+    def add_listener(self, event_type: str, func):
+        self._events.add_listener(event_type, func)
+
+    def remove_listener(self, event_type: str, func):
+        self._events.remove_listener(event_type, func)
+
+    async def wait_for(self, event_type: str, check=None, timeout: float = None, key=None) -> dict:
+        """
+        Waits for the next event of the given type for which `check` returns True.
+
+        `key` restricts the wait to events with that value in the field listed in
+        `EventRegistry.KEY_FIELDS`, e.g. the channel id for MESSAGE_CREATE.
+        Raises `asyncio.TimeoutError` when no such event arrives in time.
+        """
+        return await self._events.wait_for(event_type, check, timeout, key)
 
     def slash_command(self, name=None, description=None, options=None):
         def dec(func):
             cmd = SlashCommand(func, name=name, description=description, options=options)
             self._commands.append(cmd)
+            self._commands_by_name[cmd.name] = cmd
             return cmd
         return dec
     
\ No newline at end of file
@@ -0,0 +1,389 @@
+import logging
+
+from collections import OrderedDict
+from typing import Dict, Optional, Union
+
+from .entities import User, Guild, Channel, Role, Member
+from .utils import parse_snowflake
+
+__all__ = [ "Cache", "EntityStore", "LRUStore" ]
+
+_logger = logging.getLogger(__name__)
+
+
+class EntityStore:
+    """Unbounded store of entities keyed by their id."""
+
+    def __init__(self) -> None:
+        self._items = {}
+
+    def get(self, key):
+        return self._items.get(key)
+
+    def put(self, key, entity):
+        """Stores the entity, returns the entity evicted to make room for it, if any."""
+        self._items[key] = entity
+        return None
+
+    def remove(self, key):
+        return self._items.pop(key, None)
+
+    def keys(self):
+        return self._items.keys()
+
+    def values(self):
+        return self._items.values()
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def __contains__(self, key) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __str__(self) -> str:
+        return f"{type(self).__name__}{{size={len(self)}}}"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+class LRUStore(EntityStore):
+    """Store holding at most `maxsize` entities, evicting the least recently used one."""
+
+    def __init__(self, maxsize: int) -> None:
+        if maxsize <= 0:
+            raise ValueError("LRUStore needs a positive maxsize.")
+        self._items = OrderedDict()
+        self.maxsize = maxsize
+        self.evictions = 0
+
+    def get(self, key):
+        entity = self._items.get(key)
+        if entity is not None:
+            self._items.move_to_end(key)
+        return entity
+
+    def put(self, key, entity):
+        self._items[key] = entity
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self.evictions += 1
+            return self._items.popitem(last=False)[1]
+        return None
+
+    def __str__(self) -> str:
+        return f"LRUStore{{size={len(self)}, maxsize={self.maxsize}, evictions={self.evictions}}}"
+
+
+StoreSpec = Union[EntityStore, int, bool, None]
+
+
+def _make_store(spec: StoreSpec) -> Optional[EntityStore]:
+    if spec is False:
+        return None
+    if spec is None or spec is True:
+        return EntityStore()
+    if isinstance(spec, int):
+        return LRUStore(spec)
+    return spec
+
+
+class Cache:
+    """
+    In-memory state of the guilds the bot is in, kept up to date from gateway events.
+
+    Every entity type has its own store. A store can be given as an `EntityStore`
+    instance, as an int which creates an `LRUStore` of that size, as `None`
+    for an unbounded store or as `False` to not cache that type at all.
+    Members are keyed by `(guild_id, user_id)`, everything else by its id.
+    """
+
+    DEFAULT_LIMITS = {
+        "guilds": None,
+        "channels": None,
+        "roles": None,
+        "members": 100_000,
+        "users": 100_000,
+    }
+
+    def __init__(self, **stores: StoreSpec) -> None:
+        unknown = set(stores) - set(Cache.DEFAULT_LIMITS)
+        if unknown:
+            raise TypeError(f"Unknown entity stores: {', '.join(sorted(unknown))}")
+
+        specs = dict(Cache.DEFAULT_LIMITS, **stores)
+        self.guilds: Optional[EntityStore] = _make_store(specs["guilds"])
+        self.channels: Optional[EntityStore] = _make_store(specs["channels"])
+        self.roles: Optional[EntityStore] = _make_store(specs["roles"])
+        self.members: Optional[EntityStore] = _make_store(specs["members"])
+        self.users: Optional[EntityStore] = _make_store(specs["users"])
+
+        self._handlers = {
+            "READY": self._on_ready,
+            "GUILD_CREATE": self._on_guild_create,
+            "GUILD_UPDATE": self._on_guild_update,
+            "GUILD_DELETE": self._on_guild_delete,
+            "CHANNEL_CREATE": self._on_channel_create,
+            "CHANNEL_UPDATE": self._on_channel_update,
+            "CHANNEL_DELETE": self._on_channel_delete,
+            "THREAD_CREATE": self._on_channel_create,
+            "THREAD_UPDATE": self._on_channel_update,
+            "THREAD_DELETE": self._on_channel_delete,
+            "GUILD_ROLE_CREATE": self._on_role_create,
+            "GUILD_ROLE_UPDATE": self._on_role_update,
+            "GUILD_ROLE_DELETE": self._on_role_delete,
+            "GUILD_MEMBER_ADD": self._on_member_add,
+            "GUILD_MEMBER_UPDATE": self._on_member_update,
+            "GUILD_MEMBER_REMOVE": self._on_member_remove,
+            "GUILD_MEMBERS_CHUNK": self._on_members_chunk,
+            "USER_UPDATE": self._on_user_update,
+        }
+
+    def apply(self, event_type: str, data: dict) -> None:
+        handler = self._handlers.get(event_type)
+        if handler:
+            handler(data)
+
+    # ids are stored as ints, but the getters also accept the strings found in raw payloads
+
+    def get_guild(self, guild_id) -> Optional[Guild]:
+        return self.guilds.get(int(guild_id)) if self.guilds is not None else None
+
+    def get_channel(self, channel_id) -> Optional[Channel]:
+        return self.channels.get(int(channel_id)) if self.channels is not None else None
+
+    def get_role(self, role_id) -> Optional[Role]:
+        return self.roles.get(int(role_id)) if self.roles is not None else None
+
+    def get_member(self, guild_id, user_id) -> Optional[Member]:
+        return self.members.get( (int(guild_id), int(user_id)) ) if self.members is not None else None
+
+    def get_user(self, user_id) -> Optional[User]:
+        return self.users.get(int(user_id)) if self.users is not None else None
+
+    def clear(self) -> None:
+        for store in self._stores().values():
+            store.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return { name: len(store) for name, store in self._stores().items() }
+
+    def _stores(self) -> Dict[str, EntityStore]:
+        stores = {
+            "guilds": self.guilds,
+            "channels": self.channels,
+            "roles": self.roles,
+            "members": self.members,
+            "users": self.users,
+        }
+        return { name: store for name, store in stores.items() if store is not None }
+
+    # ---- entity helpers ----
+
+    def _store_user(self, data: dict) -> User:
+        if self.users is None:
+            return User(data)
+        user = self.users.get(int(data["id"]))
+        if user is None:
+            user = User(data)
+            # key by the entity's own id so the int is not stored twice
+            self.users.put(user.id, user)
+        else:
+            user.update(data)
+        return user
+
+    def _store_channel(self, data: dict, guild_id: int = None) -> None:
+        if self.channels is None:
+            return
+        channel = Channel(data)
+        if channel.guild_id is None:
+            channel.guild_id = guild_id
+        evicted = self.channels.put(channel.id, channel)
+
+        guild = self._guild(channel.guild_id)
+        if guild:
+            guild.channel_ids.add(channel.id)
+        if evicted is not None:
+            evicted_guild = self._guild(evicted.guild_id)
+            if evicted_guild:
+                evicted_guild.channel_ids.discard(evicted.id)
+
+    def _store_role(self, data: dict, guild_id: int) -> None:
+        if self.roles is None:
+            return
+        role = Role(data, guild_id)
+        evicted = self.roles.put(role.id, role)
+
+        guild = self._guild(guild_id)
+        if guild:
+            guild.role_ids[role.id] = role.id
+        if evicted is not None:
+            evicted_guild = self._guild(evicted.guild_id)
+            if evicted_guild:
+                evicted_guild.role_ids.pop(evicted.id, None)
+
+    def _store_member(self, data: dict, guild_id: int) -> None:
+        if self.members is None:
+            return
+        user = self._store_user(data["user"])
+        guild = self._guild(guild_id)
+        role_ids = None
+        if guild:
+            # share the guild's ints, the ones parsed from the event would be a copy per member
+            guild_id = guild.id
+            role_ids = guild.role_ids
+        key = (guild_id, user.id)
+        member = self.members.get(key)
+        if member is not None:
+            # the user may have been evicted and stored again since
+            member.user = user
+            member.update(data, role_ids)
+            return
+
+        evicted = self.members.put(key, Member(data, user, guild_id, role_ids))
+        if guild:
+            guild.member_ids.add(user.id)
+        if evicted is not None:
+            evicted_guild = self._guild(evicted.guild_id)
+            if evicted_guild:
+                evicted_guild.member_ids.discard(evicted.id)
+
+    def _guild(self, guild_id: Optional[int]) -> Optional[Guild]:
+        if self.guilds is None or guild_id is None:
+            return None
+        return self.guilds.get(guild_id)
+
+    # ---- event handlers ----
+
+    def _on_ready(self, data: dict) -> None:
+        # a new session, the whole state is going to be sent again
+        self.clear()
+        if self.guilds is None:
+            return
+        # the guilds are unavailable until their GUILD_CREATE arrives
+        for guild_data in data.get("guilds", []):
+            guild = Guild(guild_data)
+            self.guilds.put(guild.id, guild)
+
+    def _on_guild_create(self, data: dict) -> None:
+        guild_id = int(data["id"])
+
+        if self.guilds is not None:
+            guild = self.guilds.get(guild_id)
+            if guild is None:
+                self.guilds.put(guild_id, Guild(data))
+            else:
+                guild.update(data)
+
+        for channel_data in data.get("channels", []):
+            self._store_channel(channel_data, guild_id)
+        for thread_data in data.get("threads", []):
+            self._store_channel(thread_data, guild_id)
+        for role_data in data.get("roles", []):
+            self._store_role(role_data, guild_id)
+        for member_data in data.get("members", []):
+            self._store_member(member_data, guild_id)
+
+    def _on_guild_update(self, data: dict) -> None:
+        guild = self._guild(int(data["id"]))
+        if guild:
+            guild.update(data)
+
+    def _on_guild_delete(self, data: dict) -> None:
+        guild_id = int(data["id"])
+
+        # an outage, the guild will come back with another GUILD_CREATE
+        if data.get("unavailable"):
+            guild = self._guild(guild_id)
+            if guild:
+                guild.unavailable = True
+            return
+
+        guild = self.guilds.remove(guild_id) if self.guilds is not None else None
+        if guild:
+            if self.channels is not None:
+                for channel_id in guild.channel_ids:
+                    self.channels.remove(channel_id)
+            if self.roles is not None:
+                for role_id in guild.role_ids:
+                    self.roles.remove(role_id)
+            if self.members is not None:
+                for user_id in guild.member_ids:
+                    self.members.remove( (guild_id, user_id) )
+        elif self.members is not None and self.guilds is None:
+            # without cached guilds there is no index of their members
+            stale = [ key for key in self.members.keys() if key[0] == guild_id ]
+            for key in stale:
+                self.members.remove(key)
+
+    def _on_channel_create(self, data: dict) -> None:
+        self._store_channel(data)
+
+    def _on_channel_update(self, data: dict) -> None:
+        channel = self.get_channel(data["id"])
+        if channel:
+            channel.update(data)
+        else:
+            self._store_channel(data)
+
+    def _on_channel_delete(self, data: dict) -> None:
+        channel_id = int(data["id"])
+        if self.channels is not None:
+            self.channels.remove(channel_id)
+        guild = self._guild(parse_snowflake(data.get("guild_id")))
+        if guild:
+            guild.channel_ids.discard(channel_id)
+
+    def _on_role_create(self, data: dict) -> None:
+        self._store_role(data["role"], int(data["guild_id"]))
+
+    def _on_role_update(self, data: dict) -> None:
+        role = self.get_role(data["role"]["id"])
+        if role:
+            role.update(data["role"])
+        else:
+            self._store_role(data["role"], int(data["guild_id"]))
+
+    def _on_role_delete(self, data: dict) -> None:
+        role_id = int(data["role_id"])
+        if self.roles is not None:
+            self.roles.remove(role_id)
+        guild = self._guild(int(data["guild_id"]))
+        if guild:
+            guild.role_ids.pop(role_id, None)
+
+    def _on_member_add(self, data: dict) -> None:
+        guild_id = int(data["guild_id"])
+        self._store_member(data, guild_id)
+        guild = self._guild(guild_id)
+        if guild and guild.member_count is not None:
+            guild.member_count += 1
+
+    def _on_member_update(self, data: dict) -> None:
+        self._store_member(data, int(data["guild_id"]))
+
+    def _on_member_remove(self, data: dict) -> None:
+        guild_id = int(data["guild_id"])
+        user_id = int(data["user"]["id"])
+        if self.members is not None:
+            self.members.remove( (guild_id, user_id) )
+        guild = self._guild(guild_id)
+        if guild:
+            guild.member_ids.discard(user_id)
+            if guild.member_count:
+                guild.member_count -= 1
+
+    def _on_members_chunk(self, data: dict) -> None:
+        guild_id = int(data["guild_id"])
+        for member_data in data["members"]:
+            self._store_member(member_data, guild_id)
+
+    def _on_user_update(self, data: dict) -> None:
+        if self.users is not None:
+            self._store_user(data)
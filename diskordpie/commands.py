@@ -1,10 +1,14 @@
 from enum import IntEnum
 import inspect
-import json
+import logging
 
 from .http import HttpClient
+from .entities import User
+from .utils import snowflake_time, parse_snowflake, Field
 
-__all__ = [ "OptionType", "Option", "SlashCommand" ]
+__all__ = [ "OptionType", "Option", "Choice", "SlashCommand" ]
+
+_logger = logging.getLogger(__name__)
 
 class OptionType(IntEnum):
     SUB_COMMAND = 1	
@@ -19,10 +23,47 @@ class OptionType(IntEnum):
     NUMBER = 10	
 
     def to_json(self):
-        return self.value()
+        return self.value
+
+
+class InteractionResponseType(IntEnum):
+    PONG = 1
+    CHANNEL_MESSAGE_WITH_SOURCE = 4
+    DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE = 5
+    DEFERRED_UPDATE_MESSAGE = 6
+    UPDATE_MESSAGE = 7
+    APPLICATION_COMMAND_AUTOCOMPLETE_RESULT = 8
+
+
+class Choice:
+
+    __slots__ = ("name", "value")
+
+    _json_fields = ("name", "value")
+
+    def __init__(self, name: str, value) -> None:
+        self.name = name
+        self.value = value
+
 
 class Option:
 
+    __slots__ = ("_id", "type", "name", "description", "required", "choices", "options",
+                 "channel_types", "min_value", "max_value", "autocomplete", "_arg_name")
+
+    _json_fields = (
+        Field("type", enum=True),
+        "name",
+        "description",
+        "required",
+        Field("choices", nested=True),
+        Field("options", nested=True),
+        Field("channel_types", nested=True),
+        "min_value",
+        "max_value",
+        "autocomplete",
+    )
+
     def __init__(self, **kwargs) -> None:
         self._id = None
         self.type = kwargs.get("type")
@@ -55,6 +96,8 @@ class SlashCommand:
         bool: OptionType.BOOLEAN,
     }
 
+    _json_fields = ("name", "description", Field("options", nested=True))
+
     def __init__(self, func, *, name=None, description="placeholder", options=None) -> None:
         if not inspect.iscoroutinefunction(func):
             raise TypeError("Cannot make a command from non async function.")
@@ -76,7 +119,7 @@ class SlashCommand:
 
             if options and arg_name in options:
                 opt = options[arg_name]
-                opt.arg_name = arg_name
+                opt._arg_name = arg_name
             else:
                 opt = Option(arg_name=arg_name)
 
@@ -103,8 +146,21 @@ class SlashCommand:
         await self.invoke(interaction, **kwargs)
 
 
+class InteractionResponse:
+
+    __slots__ = ("type", "data")
+
+    _json_fields = (Field("type", enum=True), Field("data", nested=True))
+
+    def __init__(self, type: InteractionResponseType, data=None) -> None:
+        self.type = type
+        self.data = data
+
+
 class InteractionArg:
 
+    __slots__ = ("name", "type", "value")
+
     def __init__(self, arg_json) -> None:
         self.name = arg_json["name"]
         self.type = arg_json["type"]
@@ -116,11 +172,14 @@ class InteractionArg:
 
 class Interaction:
 
+    __slots__ = ("_http", "_id", "_app_id", "_token", "_type", "_cmd_id", "_cmd_name", "_cmd_type",
+                 "_args", "_version", "_data", "_user", "_trace")
+
     def __init__(self, http: HttpClient, json_data) -> None:
         self._http = http
 
-        self._id = json_data["id"]
-        self._app_id = json_data["application_id"]
+        self._id = int(json_data["id"])
+        self._app_id = int(json_data["application_id"])
         self._token = json_data["token"]
         self._type = json_data["type"]
 
@@ -130,7 +189,7 @@ class Interaction:
 
         inter_data = json_data["data"]
         
-        self._cmd_id = inter_data["id"]
+        self._cmd_id = int(inter_data["id"])
         self._cmd_name = inter_data["name"]
         self._cmd_type = inter_data["type"]
 
@@ -140,15 +199,37 @@ class Interaction:
             self._args.append( InteractionArg(arg_json) )
 
         self._version = json_data["version"]
-        
+
+        # the rest is parsed only when asked for
+        self._data = json_data
+        self._user = None
+
+        # set by the bot when tracing is enabled
+        self._trace = None
+
+    @property
+    def created_at(self):
+        return snowflake_time(self._id)
+
+    @property
+    def guild_id(self):
+        return parse_snowflake(self._data.get("guild_id"))
+
+    @property
+    def channel_id(self):
+        return parse_snowflake(self._data.get("channel_id"))
+
+    @property
+    def user(self) -> User:
+        # in guilds the user is sent wrapped in a member object
+        if self._user is None:
+            member = self._data.get("member")
+            self._user = User(member["user"] if member else self._data["user"])
+        return self._user
+
     
     async def respond(self, msg: str):
         url = f"/interactions/{self._id}/{self._token}/callback"
-        payload = {
-            "type": 4, # CHANNEL_MESSAGE_WITH_SOURCE
-            "data": {
-                "content": msg,
-            }
-        }
-        r = await self._http.post(url, payload)
-        print(r)
+        payload = InteractionResponse(InteractionResponseType.CHANNEL_MESSAGE_WITH_SOURCE, { "content": msg })
+        await self._http.post(url, payload, trace=self._trace)
+        _logger.debug(f"Responded to interaction {self._id}.")
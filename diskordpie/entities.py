@@ -1,16 +1,220 @@
+import sys
 
-class User:
+from datetime import datetime, timezone
+from typing import Dict, Optional
 
-    def __init__(self, **kwargs) -> None:
+from .utils import snowflake_time, parse_snowflake
+
+# Entities are created for every object the cache holds, so they use __slots__
+# and store ids as ints. Nested fields which are rarely needed are kept raw and
+# parsed the first time they are accessed.
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # there are only 10000 discriminators, no need to keep a copy for every user
+    return sys.intern(value) if value is not None else None
+
+
+class Entity:
+
+    __slots__ = ("id",)
+
+    @property
+    def created_at(self) -> datetime:
+        return snowflake_time(self.id)
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.id == other.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}{{id={self.id}}}"
+
+
+class User(Entity):
+
+    __slots__ = ("username", "discriminator", "avatar", "bot")
+
+    def __init__(self, data: dict) -> None:
         # TODO: add all the other fields
-        self.id = kwargs.get("id")
-        self.username = kwargs.get("username")
-        self.discriminator = kwargs.get("discriminator")
-        self.bot = kwargs.get("bot")
+        self.id = int(data["id"])
+        self.username = data.get("username")
+        self.discriminator = _intern(data.get("discriminator"))
+        self.avatar = data.get("avatar")
+        self.bot = data.get("bot", False)
+
+    def update(self, data: dict) -> None:
+        if "username" in data:
+            self.username = data["username"]
+        if "discriminator" in data:
+            self.discriminator = _intern(data["discriminator"])
+        if "avatar" in data:
+            self.avatar = data["avatar"]
+
+
+class Application(Entity):
+
+    __slots__ = ("flags",)
+
+    def __init__(self, data: dict) -> None:
+        self.id = int(data["id"])
+        self.flags = data.get("flags")
+
+
+class Guild(Entity):
+
+    __slots__ = ("name", "icon", "owner_id", "member_count", "unavailable", "_features",
+                 "channel_ids", "role_ids", "member_ids")
+
+    def __init__(self, data: dict) -> None:
+        self.id = int(data["id"])
+        self.name = None
+        self.icon = None
+        self.owner_id = None
+        self.member_count = None
+        self.unavailable = False
+        self._features = ()
+
+        # ids of the channels, roles and members (by user id) stored in the cache,
+        # the roles map to their own id so members can share the int objects
+        self.channel_ids = set()
+        self.role_ids: Dict[int, int] = {}
+        self.member_ids = set()
+
+        self.update(data)
+
+    @property
+    def features(self) -> frozenset:
+        if not isinstance(self._features, frozenset):
+            self._features = frozenset(self._features)
+        return self._features
+
+    def update(self, data: dict) -> None:
+        if "name" in data:
+            self.name = data["name"]
+        if "icon" in data:
+            self.icon = data["icon"]
+        if "owner_id" in data:
+            self.owner_id = parse_snowflake(data["owner_id"])
+        if "member_count" in data:
+            self.member_count = data["member_count"]
+        if "features" in data:
+            self._features = data["features"]
+        self.unavailable = data.get("unavailable", False)
+
+
+class Channel(Entity):
+
+    __slots__ = ("type", "guild_id", "name", "position", "parent_id", "topic", "nsfw")
+
+    def __init__(self, data: dict) -> None:
+        self.id = int(data["id"])
+        self.type = data.get("type")
+        self.guild_id = parse_snowflake(data.get("guild_id"))
+        self.name = data.get("name")
+        self.position = data.get("position")
+        self.parent_id = parse_snowflake(data.get("parent_id"))
+        self.topic = data.get("topic")
+        self.nsfw = data.get("nsfw", False)
+
+    def update(self, data: dict) -> None:
+        if "type" in data:
+            self.type = data["type"]
+        if "name" in data:
+            self.name = data["name"]
+        if "position" in data:
+            self.position = data["position"]
+        if "parent_id" in data:
+            self.parent_id = parse_snowflake(data["parent_id"])
+        if "topic" in data:
+            self.topic = data["topic"]
+        if "nsfw" in data:
+            self.nsfw = data["nsfw"]
+
+
+class Role(Entity):
+
+    __slots__ = ("guild_id", "name", "color", "position", "_permissions", "hoist", "mentionable")
+
+    def __init__(self, data: dict, guild_id: int) -> None:
+        self.id = int(data["id"])
+        self.guild_id = guild_id
+        self.name = None
+        self.color = 0
+        self.position = 0
+        self._permissions = "0"
+        self.hoist = False
+        self.mentionable = False
+        self.update(data)
+
+    @property
+    def permissions(self) -> int:
+        # sent as a string since it does not fit into a javascript number
+        if isinstance(self._permissions, str):
+            self._permissions = int(self._permissions)
+        return self._permissions
+
+    def update(self, data: dict) -> None:
+        if "name" in data:
+            self.name = data["name"]
+        if "color" in data:
+            self.color = data["color"]
+        if "position" in data:
+            self.position = data["position"]
+        if "permissions" in data:
+            self._permissions = data["permissions"]
+        if "hoist" in data:
+            self.hoist = data["hoist"]
+        if "mentionable" in data:
+            self.mentionable = data["mentionable"]
+
+
+class Member:
+
+    __slots__ = ("user", "guild_id", "nick", "roles", "_joined_at", "pending")
+
+    def __init__(self, data: dict, user: User, guild_id: int, role_ids: Dict[int, int] = None) -> None:
+        self.user = user
+        self.guild_id = guild_id
+        self.nick = None
+        self.roles = ()
+        # unix time as a float, 24 bytes against about 80 for the iso string
+        self._joined_at = None
+        self.pending = False
+        self.update(data, role_ids)
+
+    @property
+    def id(self) -> int:
+        return self.user.id
+
+    @property
+    def joined_at(self) -> Optional[datetime]:
+        if self._joined_at is None:
+            return None
+        return datetime.fromtimestamp(self._joined_at, timezone.utc)
+
+    def update(self, data: dict, role_ids: Dict[int, int] = None) -> None:
+        """`role_ids` maps role ids to the int objects the members of the guild share."""
+        if "nick" in data:
+            self.nick = data["nick"]
+        if "roles" in data:
+            roles = map(int, data["roles"])
+            if role_ids:
+                roles = ( role_ids.get(role, role) for role in roles )
+            self.roles = tuple(roles)
+        if "joined_at" in data:
+            joined_at = data["joined_at"]
+            self._joined_at = datetime.fromisoformat(joined_at).timestamp() if joined_at else None
+        if "pending" in data:
+            self.pending = data["pending"]
 
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Member) and self.guild_id == other.guild_id and self.id == other.id
 
-class Application:
+    def __hash__(self) -> int:
+        return hash( (self.guild_id, self.id) )
 
-    def __init__(self, **kwargs) -> None:
-        self.id = kwargs.get("id")
-        self.flags = kwargs.get("flags")
+    def __repr__(self) -> str:
+        return f"Member{{guild_id={self.guild_id}, id={self.id}}}"
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+
+from typing import Awaitable, Callable, Dict, List, Optional
+
+__all__ = [ "EventRegistry" ]
+
+_logger = logging.getLogger(__name__)
+
+Listener = Callable[[dict], Awaitable[None]]
+Check = Callable[[dict], bool]
+
+
+class EventRegistry:
+    """
+    Listeners and `wait_for` waiters indexed by event type.
+
+    Waiters can additionally be indexed by a key, the value of the field listed
+    for their event type in `KEY_FIELDS`, so an event only ever checks the waiters
+    registered for its own key and those registered without one.
+    """
+
+    KEY_FIELDS = {
+        "MESSAGE_CREATE": "channel_id",
+        "MESSAGE_UPDATE": "channel_id",
+        "MESSAGE_DELETE": "channel_id",
+        "TYPING_START": "channel_id",
+        "MESSAGE_REACTION_ADD": "message_id",
+        "MESSAGE_REACTION_REMOVE": "message_id",
+        "INTERACTION_CREATE": "channel_id",
+        "CHANNEL_UPDATE": "id",
+        "GUILD_MEMBER_ADD": "guild_id",
+        "GUILD_MEMBER_UPDATE": "guild_id",
+        "GUILD_MEMBER_REMOVE": "guild_id",
+        "GUILD_UPDATE": "id",
+    }
+
+    def __init__(self) -> None:
+        self._listeners: Dict[str, List[Listener]] = {}
+        # event type -> key -> future -> check
+        self._waiters: Dict[str, Dict[Optional[str], Dict[asyncio.Future, Optional[Check]]]] = {}
+        self._tasks = set()
+
+    def add_listener(self, event_type: str, listener: Listener) -> None:
+        if not asyncio.iscoroutinefunction(listener):
+            raise TypeError("Listeners have to be async functions.")
+        self._listeners.setdefault(event_type, []).append(listener)
+
+    def remove_listener(self, event_type: str, listener: Listener) -> None:
+        listeners = self._listeners.get(event_type)
+        if listeners and listener in listeners:
+            listeners.remove(listener)
+            if not listeners:
+                del self._listeners[event_type]
+
+    async def wait_for(self, event_type: str, check: Optional[Check] = None,
+                       timeout: Optional[float] = None, key=None) -> dict:
+        if key is not None:
+            if event_type not in EventRegistry.KEY_FIELDS:
+                raise ValueError(f"Events of type {event_type} can't be waited for by key.")
+            key = str(key)
+
+        future = asyncio.get_running_loop().create_future()
+        by_key = self._waiters.setdefault(event_type, {})
+        by_key.setdefault(key, {})[future] = check
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._remove_waiter(event_type, key, future)
+
+    def dispatch(self, event_type: str, data: dict) -> None:
+        by_key = self._waiters.get(event_type)
+        if by_key:
+            self._resolve_waiters(event_type, by_key, None, data)
+            key_field = EventRegistry.KEY_FIELDS.get(event_type)
+            if key_field and data.get(key_field) is not None:
+                self._resolve_waiters(event_type, by_key, str(data[key_field]), data)
+
+        for listener in self._listeners.get(event_type, ()):
+            self.spawn(listener(data), f"listener {listener.__qualname__} for {event_type}")
+
+    def spawn(self, coro: Awaitable, name: str) -> asyncio.Task:
+        """Runs a handler in its own task so it can't stall the gateway."""
+        task = asyncio.create_task(self._run_handler(coro, name), name=name)
+        # the loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def cancel_all(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for by_key in self._waiters.values():
+            for waiters in by_key.values():
+                for future in waiters:
+                    future.cancel()
+        self._waiters.clear()
+
+    async def _run_handler(self, coro: Awaitable, name: str) -> None:
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _logger.exception(f"Exception in {name}.")
+
+    def _resolve_waiters(self, event_type: str, by_key: dict, key: Optional[str], data: dict) -> None:
+        waiters = by_key.get(key)
+        if not waiters:
+            return
+
+        resolved = []
+        for future, check in waiters.items():
+            if future.done():
+                resolved.append(future)
+                continue
+            try:
+                if check is None or check(data):
+                    future.set_result(data)
+                    resolved.append(future)
+            except Exception as e:
+                future.set_exception(e)
+                resolved.append(future)
+
+        for future in resolved:
+            self._remove_waiter(event_type, key, future)
+
+    def _remove_waiter(self, event_type: str, key: Optional[str], future: asyncio.Future) -> None:
+        by_key = self._waiters.get(event_type)
+        if not by_key:
+            return
+        waiters = by_key.get(key)
+        if waiters is None:
+            return
+        waiters.pop(future, None)
+        if not waiters:
+            del by_key[key]
+            if not by_key:
+                del self._waiters[event_type]
@@ -1,24 +1,33 @@
-import aiohttp
 import asyncio
+import json
 import sys
 import random
 import logging
 import time
 
-from enum import IntEnum
+from collections import deque
+from enum import IntEnum, IntFlag
+from typing import TYPE_CHECKING, Iterable, Optional
 
 from . import http
+from .utils import to_dict
+from .tracing import Tracer
 
+if TYPE_CHECKING:
+    import aiohttp
 
-__all__ = [ "Gateway", "ReconnectGateway", "GatewayDisconnected" ]
+
+__all__ = [ "Gateway", "ReconnectGateway", "GatewayDisconnected", "Intents" ]
 
 _logger = logging.getLogger(__name__)
 
 
 class ReconnectGateway(Exception):
     
-    def __init__(self, resume):
+    def __init__(self, resume, code=None):
         self.resume = resume
+        # the websocket close code if the reconnect was caused by the connection closing
+        self.code = code
 
 
 class GatewayDisconnected(Exception):
@@ -29,13 +38,18 @@ class GatewayDisconnected(Exception):
 
 class GatewayEvent:
 
-    def __init__(self, event_json) -> None:
+    def __init__(self, event_json, received_at=None, decode_time=None) -> None:
         if event_json["op"] != 0:
             raise Exception("Can't create Event from non DISPATCH message.")
 
         self.type = event_json["t"]
         self.data = event_json["d"]
 
+        # perf_counter time of the frame arrival and the time spent decoding it,
+        # only measured when tracing is enabled
+        self.received_at = received_at
+        self.decode_time = decode_time
+
 
 class CloseCode(IntEnum):
     CLOSE_NORMAL = 1000
@@ -77,22 +91,92 @@ class OpCode(IntEnum):
     HEARTBEAT_ACK = 11
 
 
+class Intents(IntFlag):
+    GUILDS = 1 << 0
+    GUILD_MEMBERS = 1 << 1
+    GUILD_BANS = 1 << 2
+    GUILD_EMOJIS_AND_STICKERS = 1 << 3
+    GUILD_INTEGRATIONS = 1 << 4
+    GUILD_WEBHOOKS = 1 << 5
+    GUILD_INVITES = 1 << 6
+    GUILD_VOICE_STATES = 1 << 7
+    GUILD_PRESENCES = 1 << 8
+    GUILD_MESSAGES = 1 << 9
+    GUILD_MESSAGE_REACTIONS = 1 << 10
+    GUILD_MESSAGE_TYPING = 1 << 11
+    DIRECT_MESSAGES = 1 << 12
+    DIRECT_MESSAGE_REACTIONS = 1 << 13
+    DIRECT_MESSAGE_TYPING = 1 << 14
+
+    # GUILDS is needed to receive the events feeding the cache
+    DEFAULT = GUILDS | GUILD_MESSAGES
+
+
+class SendLimiter:
+    """
+    Keeps the number of messages sent over one connection under the gateway limit.
+
+    A few sends are reserved for priority messages so a burst of requests
+    can never delay a heartbeat.
+    """
+
+    def __init__(self, limit=120, period=60, reserved=5):
+        self._limit = limit
+        self._period = period
+        self._reserved = reserved
+        self._sent = deque()
+
+    async def wait(self, priority=False):
+        limit = self._limit if priority else self._limit - self._reserved
+
+        while True:
+            now = time.monotonic()
+            while self._sent and self._sent[0] <= now - self._period:
+                self._sent.popleft()
+
+            if len(self._sent) < limit:
+                self._sent.append(now)
+                return
+
+            # wait until enough of the oldest sends fall out of the window
+            await asyncio.sleep(self._sent[len(self._sent) - limit] + self._period - now)
+
+    def reset(self):
+        self._sent.clear()
+
+
 class Gateway:
 
     GET_GATEWAY_PATH = "/gateway/bot"
 
-    def __init__(self, session: aiohttp.ClientSession, http: http.HttpClient) -> None:
+    def __init__(self, session: "aiohttp.ClientSession", http: http.HttpClient, intents: Intents = Intents.DEFAULT,
+                 tracer: Tracer = None, metrics=None, recorder=None) -> None:
         self._session = session
         self._http = http
+        self._intents = intents
+        self._tracer = tracer if tracer is not None else Tracer()
+        self._timing = (None, None)
+        self._metrics = metrics
+        self._recorder = recorder
+        self._heartbeat_sent_at = None
         self._seq = None
         self._ws = None
         self._heartbeat_task = None
         self._heartbeat_acked = True
+
+        # round-trip time of the last acked heartbeat in seconds
+        self.latency = None
         self._session_id = None
         self._token = None
+        self._send_limiter = SendLimiter()
+        self._identify_callbacks = []
 
         self.resuming = False
 
+    def on_identify(self, callback) -> None:
+        """Registers a callback run right before a new session is identified."""
+        self._identify_callbacks.append(callback)
+
     async def connect(self, token, resume=False) -> None:
         if resume and not self._session_id:
             _logger.error("Can't resume without session_id!")
@@ -101,12 +185,16 @@ class Gateway:
         self.resuming = resume
         self._token = token
 
+        # INVALID_SESSION leaves the previous connection and its heartbeat running
+        await self.close()
+
         try:
             gateway_url = await self._get_gateway_url(token)
             gateway_url += "?v=9&encoding=json"
             
             _logger.debug("Connecting websocket to url: " + gateway_url)
             self._ws = await self._session.ws_connect(gateway_url)
+            self._send_limiter.reset()
 
             # receive hello message
             hello_msg = await self._receive()
@@ -117,7 +205,7 @@ class Gateway:
             _logger.info(f"Starting heartbeat with interval {interval} ms")
 
             # start heartbeat
-            self._heartbeat_task = asyncio.create_task(self._heartbeater(interval))
+            self._heartbeat_task = asyncio.create_task(self._heartbeater(interval), name="gateway heartbeat")
             
             # send identify message or resume
             if not resume:
@@ -142,11 +230,11 @@ class Gateway:
                     self._session_id = data["d"]["session_id"]
                 if data["t"] == "RESUMED":
                     self.resuming = False
-                return GatewayEvent(data)
+                return GatewayEvent(data, *self._timing)
             
             if op == OpCode.HEARTBEAT:
                 _logger.debug("Request to send hearbeat received.")
-                self._send_heartbeat()
+                await self._send_heartbeat()
             elif op == OpCode.RECONNECT:
                 # we should immediately reconnect and resume
                 _logger.warning("We were requested to reconnect.")
@@ -165,16 +253,26 @@ class Gateway:
             elif op == OpCode.HEARTBEAT_ACK:
                 _logger.debug("Hearbeat acked.")
                 self._heartbeat_acked = True
+                if self._heartbeat_sent_at is not None:
+                    self.latency = time.perf_counter() - self._heartbeat_sent_at
+                    self._heartbeat_sent_at = None
+                    if self._metrics is not None:
+                        self._metrics.heartbeat_latency.observe(self.latency)
+                        self._metrics.last_heartbeat_latency.set(self.latency)
             else:
                 raise Exception(f"Gateway received unknown opcode {op}")
 
     async def _identify(self, token):
         _logger.info("Sending identify.")
+        # whatever was pending on the previous session is lost, but nothing sent
+        # on the new one can be affected yet
+        for callback in self._identify_callbacks:
+            callback()
         data = {
             "op": OpCode.IDENTIFY,
             "d": {
                 "token": token,
-                "intents": 1 << 9,
+                "intents": int(self._intents),
                 "properties": {
                     "$os": sys.platform,
                     "$browser": "diskord-pie",
@@ -182,7 +280,7 @@ class Gateway:
                 }
             }
         }
-        await self.send(data)
+        await self.send(data, priority=True)
 
     async def _resume(self, token):
         _logger.info("Attempting to resume.")
@@ -194,7 +292,7 @@ class Gateway:
                 "seq": self._seq
             }
         }
-        await self.send(data)
+        await self.send(data, priority=True)
 
     async def _get_gateway_url(self, token: str) -> str:
         data = await self._http.get(Gateway.GET_GATEWAY_PATH)
@@ -203,15 +301,16 @@ class Gateway:
         return data["url"]
             
     async def _receive(self):
+        from aiohttp import WSMsgType
+
         msg = await self._ws.receive()
 
-        if msg.type == aiohttp.WSMsgType.TEXT or msg.type == aiohttp.WSMsgType.BINARY:
-            json_data = msg.json()
-            if json_data.get("s"):
-                self._seq = json_data["s"]
-            return json_data
+        if msg.type == WSMsgType.TEXT or msg.type == WSMsgType.BINARY:
+            if self._recorder is not None:
+                self._recorder.write(msg.data)
+            return self._decode(msg.data)
 
-        if msg.type in [ aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.CLOSING ]:
+        if msg.type in [ WSMsgType.CLOSE, WSMsgType.CLOSED, WSMsgType.CLOSING ]:
             code = self._ws.close_code
             _logger.info(f"WebSocket closed with code {code} {_close_code_str(code)} and data '{msg.data}'")
 
@@ -219,25 +318,54 @@ class Gateway:
             
             # codes for which we will try to resume the session
             if code in [ CloseCode.CLOSE_NORMAL, CloseCode.NO_HEARTBEAT_ACK ]:
-                raise ReconnectGateway(resume=True)
+                raise ReconnectGateway(resume=True, code=code)
             
             # codes for which we will try to reconnect and create new session
             # currently no codes
             if code in [ ]:
-                raise ReconnectGateway(resume=False)
+                raise ReconnectGateway(resume=False, code=code)
             
             # now just give up
             raise GatewayDisconnected(code)
 
-        if msg.type == aiohttp.WSMsgType.ERROR:
+        if msg.type == WSMsgType.ERROR:
             _logger.error("Websocket received an error.")
             await self._end_heartbeat()
             raise RuntimeError(msg.data)
 
         raise RuntimeError("Received unknown data from WebSocket:", msg)
 
-    async def send(self, data):
-        await self._ws.send_json(data)
+    def _decode(self, raw):
+        if self._tracer.enabled:
+            received_at = time.perf_counter()
+            json_data = json.loads(raw)
+            self._timing = (received_at, time.perf_counter() - received_at)
+        else:
+            json_data = json.loads(raw)
+
+        if json_data.get("s"):
+            self._seq = json_data["s"]
+        return json_data
+
+    async def send(self, data, priority=False):
+        await self._send_limiter.wait(priority)
+        await self._ws.send_json(to_dict(data))
+
+    async def request_guild_members(self, guild_id, nonce: str, *, query: str = None, limit: int = 0,
+                                    user_ids: Optional[Iterable] = None, presences: bool = False):
+        # either query or user_ids has to be present
+        data = {
+            "guild_id": str(guild_id),
+            "limit": limit,
+            "presences": presences,
+            "nonce": nonce,
+        }
+        if user_ids is not None:
+            data["user_ids"] = [ str(user_id) for user_id in user_ids ]
+        else:
+            data["query"] = query if query is not None else ""
+
+        await self.send({ "op": OpCode.REQUEST_GUILD_MEMBERS, "d": data })
 
     async def close(self):
         if self._ws and not self._ws.closed:
@@ -287,4 +415,5 @@ class Gateway:
             "op": OpCode.HEARTBEAT,
             "d": self._seq
         }
-        await self._ws.send_json(data)
+        self._heartbeat_sent_at = time.perf_counter()
+        await self.send(data, priority=True)
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import signal
+
+from itertools import count
+from typing import Dict, List
+
+from .bot import Bot
+from .metrics import MetricsRegistry, MetricsServer, BotMetrics, LoopLagMonitor
+from .tracing import Tracer
+
+__all__ = [ "BotHost" ]
+
+_logger = logging.getLogger(__name__)
+
+
+class BotHost:
+    """
+    Runs many bots with different tokens on one event loop.
+
+    The bots share one `ClientSession`, and so one connection pool, as well as the
+    metrics registry, the tracer and the loop lag monitor. Each bot keeps its own
+    http client, so rate limits are still tracked per token. Bots can be added and
+    removed while the host is running.
+
+    The series of every bot are labelled with its name, see `BotMetrics`. Bots
+    created elsewhere should be given `monitor_loop=False` and the host's registry
+    and tracer, `BotHost.bot` does that.
+    """
+
+    def __init__(self, *, metrics: MetricsRegistry = None, tracer: Tracer = None, metrics_port: int = None,
+                 connection_limit: int = 0) -> None:
+        self.registry = metrics if metrics is not None else MetricsRegistry()
+        self.metrics = BotMetrics(self.registry)
+        self.tracer = tracer if tracer is not None else Tracer()
+
+        self._bots_running = self.registry.gauge("diskordpie_host_bots", "Bots running in the host.")
+        self._metrics_port = metrics_port
+        # every gateway websocket holds a connection for its whole life, so a limit
+        # lower than the number of bots would starve the REST requests
+        self._connection_limit = connection_limit
+        self._session = None
+        self._lag_monitor = None
+        self._metrics_server = None
+        self._tokens: Dict[Bot, str] = {}
+        self._tasks: Dict[Bot, asyncio.Task] = {}
+        self._task_ids = count()
+        self._closed = None
+
+    @property
+    def bots(self) -> List[Bot]:
+        return list(self._tokens)
+
+    def bot(self, **kwargs) -> Bot:
+        """Creates a bot reporting to the host's metrics registry and tracer."""
+        kwargs.setdefault("metrics", self.registry)
+        kwargs.setdefault("tracer", self.tracer)
+        # the host monitors the loop for all of its bots
+        kwargs.setdefault("monitor_loop", False)
+        return Bot(**kwargs)
+
+    def add(self, bot: Bot, token: str, name: str = None) -> None:
+        """
+        Adds the bot, it is started right away when the host is running. `name`
+        labels the metrics of the bot, by default its user id is used.
+        """
+        if bot in self._tokens:
+            raise ValueError("The bot was already added to the host.")
+        self._tokens[bot] = token
+        if name is not None:
+            bot.metrics.rename(name)
+        if self._session is not None:
+            self._start_bot(bot)
+
+    async def remove(self, bot: Bot) -> None:
+        """Stops the bot and removes it from the host."""
+        self._tokens.pop(bot, None)
+        await self._stop_bot(bot)
+
+    def run(self) -> None:
+        """Runs the host until it is closed or interrupted with ctrl-c."""
+        loop = asyncio.get_event_loop()
+
+        try:
+            main_task = loop.create_task(self.serve(), name="bot host")
+            loop.add_signal_handler(signal.SIGINT, main_task.cancel)
+            loop.run_until_complete(main_task)
+        except asyncio.CancelledError:
+            _logger.info("Host was cancelled.")
+        finally:
+            loop.close()
+
+    async def serve(self) -> None:
+        """Starts the host and waits until it is closed."""
+        try:
+            await self.start()
+            await self._closed.wait()
+        finally:
+            await self.close()
+
+    async def start(self) -> None:
+        if self._session is not None:
+            return
+        import aiohttp
+
+        self._closed = asyncio.Event()
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._connection_limit))
+        self._lag_monitor = LoopLagMonitor(self.metrics)
+        self._lag_monitor.start()
+        if self._metrics_port is not None:
+            self._metrics_server = MetricsServer(self.registry, port=self._metrics_port)
+            await self._metrics_server.start()
+
+        for bot in self._tokens:
+            self._start_bot(bot)
+
+    async def close(self) -> None:
+        if self._session is None:
+            return
+        _logger.info(f"Stopping {len(self._tasks)} bots.")
+        # the bots stay added, so starting the host again starts them again
+        for bot in list(self._tasks):
+            await self._stop_bot(bot)
+        await self._lag_monitor.stop()
+        if self._metrics_server:
+            await self._metrics_server.close()
+            self._metrics_server = None
+        await self._session.close()
+        self._session = None
+        self._closed.set()
+
+    def _start_bot(self, bot: Bot) -> None:
+        task = asyncio.create_task(bot.start(self._tokens[bot], self._session), name=f"bot {next(self._task_ids)}")
+        self._tasks[bot] = task
+        self._bots_running.set(len(self._tasks))
+        task.add_done_callback(lambda task: self._bot_stopped(bot, task))
+
+    async def _stop_bot(self, bot: Bot) -> None:
+        task = self._tasks.pop(bot, None)
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def _bot_stopped(self, bot: Bot, task: asyncio.Task) -> None:
+        # a bot stopped by the host was already forgotten
+        if self._tasks.get(bot) is task:
+            # it stopped on its own and is not restarted, so it can be added again
+            del self._tasks[bot]
+            del self._tokens[bot]
+            if not task.cancelled() and task.exception() is not None:
+                _logger.error(f"{task.get_name()} ({bot.user}) stopped with an exception.", exc_info=task.exception())
+            else:
+                _logger.warning(f"{task.get_name()} ({bot.user}) stopped.")
+        self._bots_running.set(len(self._tasks))
@@ -1,12 +1,19 @@
-import json
-import aiohttp
 import asyncio
+import logging
+import re
 import time
 
-from typing import Dict, Union
+from typing import TYPE_CHECKING, Dict, Union
+
+from .utils import to_dict
+
+if TYPE_CHECKING:
+    import aiohttp
 
 __all__ = [ "HttpClient", "DiskordHttpError" ]
 
+_logger = logging.getLogger(__name__)
+
 class Route:
     def __init__(self, path: str, method: str):
         self.path = path
@@ -27,6 +34,16 @@ class Route:
         return str(self)
 
 
+_ID_SEGMENT = re.compile(r"/\d{15,}(?=/|$)")
+_TOKEN_SEGMENT = re.compile(r"/(interactions|webhooks)/(\{id\})/[^/]+")
+
+def route_template(route: Route) -> str:
+    """The route with ids and tokens replaced, safe to use as a metric label."""
+    path = _ID_SEGMENT.sub("/{id}", route.path)
+    path = _TOKEN_SEGMENT.sub(r"/\1/\2/{token}", path)
+    return route.method + ":" + path
+
+
 def parse_rate_header(headers, target, conversion_func):
     if target in headers:
         return conversion_func( headers[target] )
@@ -61,7 +78,13 @@ class GlobalLimiter:
         self._open.set()
         self._sleeping = 0
     
-    async def wait(self):
+    async def wait(self) -> float:
+        """Waits for the limit and returns the number of seconds slept."""
+        if self._open.is_set() and self._remaining > 0:
+            self._remaining -= 1
+            return 0.0
+
+        start = time.perf_counter()
         await self._open.wait()
 
         while self._remaining == 0:
@@ -73,10 +96,11 @@ class GlobalLimiter:
                 self._refresh()
         
         self._remaining -= 1
+        return time.perf_counter() - start
 
-    async def handle_limit(self, error_json):
+    async def handle_limit(self, error_json) -> float:
         if not error_json.get("global"):
-            return
+            return 0.0
         self._sleeping += 1
         self._open.clear()
         await asyncio.sleep(error_json["retry_after"])
@@ -84,6 +108,7 @@ class GlobalLimiter:
         if self._sleeping == 0:
             self._open.set()
             self._refresh()
+        return error_json["retry_after"]
 
     def _refresh(self):
         self._next_refresh = time.time() + self._refresh_period
@@ -104,12 +129,14 @@ class Bucket:
     async def __aexit__(self, ex_type, ex_val, ex_traceback):
         self._lock.release()
 
-    async def wait(self) -> None:
+    async def wait(self) -> float:
+        """Waits for the bucket to reset if it is depleted and returns the number of seconds slept."""
         if self.remaining == 0:
-            print("Slow down buddy!")
             wait_for = self.reset_at - time.time()
             if wait_for > 0:
                 await asyncio.sleep(wait_for)
+                return wait_for
+        return 0.0
 
     def update(self, rate: RateLimitInfo) -> None:
         self.remaining = rate.remaining
@@ -133,8 +160,8 @@ class DefaultBucket:
     async def __aexit__(self, ex_type, ex_val, ex_traceback):
         return 
 
-    async def wait(self):
-        return
+    async def wait(self) -> float:
+        return 0.0
 
     def __str__(self) -> str:
         return "DefaultBucket"
@@ -154,9 +181,11 @@ class HttpClient:
 
     BASE_URL = "https://discord.com/api/v9"
 
-    def __init__(self, session: aiohttp.ClientSession) -> None:
+    def __init__(self, session: "aiohttp.ClientSession", metrics=None, base_url: str = None) -> None:
         self._session = session
+        self._base_url = base_url if base_url else HttpClient.BASE_URL
         self._token = None
+        self._metrics = metrics
 
         # rate limiting stuff
         self._route_to_bucket: Dict[Route, str] = {}
@@ -164,11 +193,14 @@ class HttpClient:
         self._global_limiter = GlobalLimiter()
         self._default_bucket = DefaultBucket()
 
-    async def post(self, url, data):
-        return await self.send_request("POST", url, data)
+    async def post(self, url, data, trace=None):
+        return await self.send_request("POST", url, data, trace=trace)
+
+    async def put(self, url, data, trace=None):
+        return await self.send_request("PUT", url, data, trace=trace)
 
-    async def get(self, path):
-        return await self.send_request("GET", path)
+    async def get(self, path, trace=None):
+        return await self.send_request("GET", path, trace=trace)
 
     async def close_session(self):
         if self._session:
@@ -177,6 +209,7 @@ class HttpClient:
     async def open_session(self):
         if self._session:
             raise Exception("Can't open a new session: a session already exists.")
+        import aiohttp
         self._session = aiohttp.ClientSession()
     
     def _get_bucket(self, route: Route) -> Union[Bucket, DefaultBucket]:
@@ -186,12 +219,15 @@ class HttpClient:
         bucket = self._buckets.get(bucket_id)
         return bucket if bucket else self._default_bucket
 
-    async def send_request(self, method: str, path: str, json_data=None, headers=None, params=None):
+    async def send_request(self, method: str, path: str, json_data=None, headers=None, params=None, trace=None):
         if not self._token:
             raise Exception("HttpClient: send_request: no token set!")
 
         route = Route(path, method)
-        url = self.BASE_URL + path
+        url = self._base_url + path
+
+        if json_data is not None:
+            json_data = to_dict(json_data)
         
         if not headers:
             headers = {}
@@ -203,12 +239,30 @@ class HttpClient:
             headers["User-Agent"] = "DiscordBot (diskord-pie)"
         
         for i in range(4):
+            if trace is not None:
+                start = time.perf_counter()
+
             async with self._get_bucket(route) as bucket:
-                await bucket.wait()
-                await self._global_limiter.wait()
+                slept = await bucket.wait()
+                if slept and self._metrics is not None:
+                    self._metrics.rate_limit_sleep.inc("bucket", amount=slept)
+                if trace is not None:
+                    now = time.perf_counter()
+                    trace.add(trace.BUCKET_WAIT, now - start)
+                    start = now
+
+                slept = await self._global_limiter.wait()
+                if slept and self._metrics is not None:
+                    self._metrics.rate_limit_sleep.inc("global", amount=slept)
+                if trace is not None:
+                    now = time.perf_counter()
+                    trace.add(trace.GLOBAL_WAIT, now - start)
+                    start = now
                 
                 async with self._session.request(method=method, url=url, json=json_data, headers=headers, params=params) as r:
-                    print(f"received HTTP response with code {r.status}")
+                    if trace is not None:
+                        trace.add(trace.HTTP, time.perf_counter() - start)
+                    _logger.debug(f"{route} responded with status {r.status}")
 
                     rate = RateLimitInfo(r.headers)
                     
@@ -221,10 +275,19 @@ class HttpClient:
                     
                     # rate limit exceeded
                     if r.status == 429:
-                        print(f"WARNING: route {route} is being rate limited!")
+                        _logger.warning(f"Route {route} is being rate limited!")
                         data = await r.json()
+                        if self._metrics is not None:
+                            scope = "global" if data["global"] else (rate.scope or "user")
+                            self._metrics.rate_limited.inc(route_template(route), scope)
                         if data["global"]:
-                            await self._global_limiter.handle_limit(data)
+                            if trace is not None:
+                                start = time.perf_counter()
+                            slept = await self._global_limiter.handle_limit(data)
+                            if self._metrics is not None:
+                                self._metrics.rate_limit_sleep.inc("global", amount=slept)
+                            if trace is not None:
+                                trace.add(trace.GLOBAL_WAIT, time.perf_counter() - start)
                         else:
                             bucket.remaining = 0
                             bucket.reset_at = time.time() + data["retry_after"]   
@@ -239,8 +302,9 @@ class HttpClient:
                     # TODO: possibly handle other status codes 
                     #       https://discord.com/developers/docs/topics/opcodes-and-status-codes
 
+                    data = None
                     if r.content_type == "application/json":
                         data = await r.json()
-                        print(json.dumps(data, indent=4))
+                        _logger.debug(f"{route} failed with {data}")
                     
-                    raise DiskordHttpError(r.status, r.reason)
+                    raise DiskordHttpError(r.status, r.reason, data)
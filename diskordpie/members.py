@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+
+from collections import deque
+from itertools import count, islice
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from .cache import Cache
+from .entities import Member, User
+from .gateway import Gateway
+
+__all__ = [ "MemberStream", "MemberChunker" ]
+
+_logger = logging.getLogger(__name__)
+
+# discord accepts at most this many user ids in one request
+MAX_USER_IDS = 100
+
+
+class MemberStream:
+    """
+    Async iterator over the members returned for one member request.
+
+    Chunks are buffered as they arrive from the gateway and handed out
+    as the stream is consumed.
+    """
+
+    def __init__(self, guild_id: int, nonces: List[str], timeout: Optional[float],
+                 chunker: "MemberChunker" = None) -> None:
+        self.guild_id = guild_id
+        self.not_found = []
+
+        self._timeout = timeout
+        self._chunker = chunker
+        self._queue = asyncio.Queue()
+        self._buffer = deque()
+        self._chunks_left: Dict[str, Optional[int]] = { nonce: None for nonce in nonces }
+        self._done = False
+
+    def _feed(self, nonce: str, members: List[Member], data: dict) -> bool:
+        """Returns True when the request with the given nonce is complete."""
+        self.not_found.extend(int(user_id) for user_id in data.get("not_found", []))
+        self._queue.put_nowait(members)
+
+        left = self._chunks_left[nonce]
+        left = (data["chunk_count"] if left is None else left) - 1
+        self._chunks_left[nonce] = left
+
+        if left > 0:
+            return False
+
+        del self._chunks_left[nonce]
+        if not self._chunks_left:
+            self._queue.put_nowait(None)
+        return True
+
+    def _fail(self, exc: Exception) -> None:
+        self._chunks_left.clear()
+        self._queue.put_nowait(exc)
+
+    def __aiter__(self) -> "MemberStream":
+        return self
+
+    async def __anext__(self) -> Member:
+        while not self._buffer:
+            if self._done:
+                raise StopAsyncIteration
+
+            try:
+                item = await asyncio.wait_for(self._queue.get(), self._timeout)
+            except asyncio.TimeoutError:
+                self._done = True
+                # the missing chunks are not going to be matched to the stream anymore
+                if self._chunker is not None:
+                    self._chunker._forget(self)
+                raise asyncio.TimeoutError(f"No member chunk received for guild {self.guild_id} in time.")
+
+            if item is None:
+                self._done = True
+            elif isinstance(item, Exception):
+                self._done = True
+                raise item
+            else:
+                self._buffer.extend(item)
+
+        return self._buffer.popleft()
+
+    async def collect(self) -> List[Member]:
+        return [ member async for member in self ]
+
+
+class MemberChunker:
+    """
+    Requests guild members over the gateway and matches the GUILD_MEMBERS_CHUNK
+    responses to the requests by their nonce.
+    """
+
+    def __init__(self, gateway: Gateway, cache: Cache, timeout: Optional[float] = 30) -> None:
+        self._gateway = gateway
+        self._cache = cache
+        self._timeout = timeout
+        self._streams: Dict[str, MemberStream] = {}
+
+        # nonces have to be unique only among our own requests
+        self._nonce_prefix = os.urandom(4).hex()
+        self._counter = count()
+
+        # chunks for requests made in the previous session are never going to arrive
+        gateway.on_identify(self._session_restarted)
+
+    def _next_nonce(self) -> str:
+        return f"{self._nonce_prefix}-{next(self._counter)}"
+
+    async def request(self, guild_id, *, query: str = "", limit: int = 0,
+                      user_ids: Optional[Iterable] = None, presences: bool = False) -> MemberStream:
+        guild_id = int(guild_id)
+
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            batches = [ user_ids[i:i + MAX_USER_IDS] for i in range(0, len(user_ids), MAX_USER_IDS) ]
+        else:
+            batches = [ None ]
+
+        nonces = [ self._next_nonce() for _ in batches ]
+        stream = MemberStream(guild_id, nonces, self._timeout, self)
+
+        if not nonces:
+            stream._queue.put_nowait(None)
+            return stream
+
+        for nonce, batch in zip(nonces, batches):
+            self._streams[nonce] = stream
+            try:
+                await self._gateway.request_guild_members(
+                    guild_id, nonce, query=query, limit=limit, user_ids=batch, presences=presences
+                )
+            except Exception as e:
+                self._forget(stream)
+                raise e
+
+        return stream
+
+    async def request_many(self, guild_ids: Iterable, *, query: str = "", limit: int = 0,
+                           presences: bool = False, max_pending: int = 5) -> AsyncIterator[Member]:
+        """
+        Streams the members of many guilds.
+
+        At most `max_pending` requests are in flight at once and a new one is sent only
+        after the consumer has drained an earlier guild, so a slow consumer never makes
+        us buffer more than `max_pending` guilds worth of members.
+        """
+        guild_ids = iter(guild_ids)
+        pending = deque()
+
+        async def send_next(n):
+            for guild_id in islice(guild_ids, n):
+                pending.append(await self.request(guild_id, query=query, limit=limit, presences=presences))
+
+        try:
+            await send_next(max_pending)
+            while pending:
+                # stays pending until drained, so it's forgotten when the consumer stops early
+                async for member in pending[0]:
+                    yield member
+                pending.popleft()
+                await send_next(1)
+        finally:
+            for stream in pending:
+                self._forget(stream)
+
+    def feed(self, data: dict) -> None:
+        nonce = data.get("nonce")
+        stream = self._streams.get(nonce)
+        if stream is None:
+            return
+
+        guild_id = stream.guild_id
+        members = []
+        for member_data in data["members"]:
+            # reuse the entities the cache created from this same event
+            member = self._cache.get_member(guild_id, member_data["user"]["id"])
+            if member is None:
+                member = Member(member_data, User(member_data["user"]), guild_id)
+            members.append(member)
+
+        if stream._feed(nonce, members, data):
+            del self._streams[nonce]
+
+    def fail_all(self, exc: Exception) -> None:
+        for stream in set(self._streams.values()):
+            stream._fail(exc)
+        self._streams.clear()
+
+    def _session_restarted(self) -> None:
+        self.fail_all(RuntimeError("Gateway session was restarted before all members were received."))
+
+    def _forget(self, stream: MemberStream) -> None:
+        for nonce in list(stream._chunks_left):
+            self._streams.pop(nonce, None)
+        stream._chunks_left.clear()
@@ -0,0 +1,335 @@
+import asyncio
+import logging
+import time
+
+from itertools import count
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .tracing import Exporter, InteractionTrace, LatencyHistogram
+
+__all__ = [ "MetricsRegistry", "MetricsServer", "BotMetrics", "MetricsExporter", "LoopLagMonitor" ]
+
+_logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [ f'{name}="{_escape(str(value))}"' for name, value in zip(names, values) ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+
+    TYPE = None
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _check(self, labels: Tuple) -> None:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {labels}.")
+
+    def render(self) -> List[str]:
+        lines = [ f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}" ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        return [ f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                 for labels, value in self._values.items() ]
+
+    def _relabel(self, old: str, new: str) -> None:
+        """Moves the series whose first label is `old` to `new`."""
+        for labels in [ labels for labels in self._values if labels and labels[0] == old ]:
+            value = self._values.pop(labels)
+            moved = (new,) + labels[1:]
+            self._values[moved] = self._merge(self._values[moved], value) if moved in self._values else value
+
+    def _merge(self, current, moved):
+        return moved
+
+
+class Counter(Metric):
+
+    TYPE = "counter"
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        if labels not in self._values:
+            self._check(labels)
+            self._values[labels] = 0.0
+        self._values[labels] += amount
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _merge(self, current: float, moved: float) -> float:
+        return current + moved
+
+
+class Gauge(Metric):
+
+    TYPE = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        if labels not in self._values:
+            self._check(labels)
+        self._values[labels] = value
+
+    def get(self, *labels) -> Optional[float]:
+        return self._values.get(labels)
+
+
+class Histogram(Metric):
+
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 bounds: Iterable[float] = LatencyHistogram.DEFAULT_BOUNDS) -> None:
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(bounds)
+
+    def observe(self, value: float, *labels) -> None:
+        histogram = self._values.get(labels)
+        if histogram is None:
+            self._check(labels)
+            histogram = self._values[labels] = LatencyHistogram(self.bounds)
+        histogram.observe(value)
+
+    def get(self, *labels) -> Optional[LatencyHistogram]:
+        return self._values.get(labels)
+
+    def _merge(self, current: LatencyHistogram, moved: LatencyHistogram) -> LatencyHistogram:
+        current.counts = [ a + b for a, b in zip(current.counts, moved.counts) ]
+        current.count += moved.count
+        current.sum += moved.sum
+        return current
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, histogram in self._values.items():
+            cumulative = 0
+            bounds = self.bounds + (float("inf"),)
+            for bound, count in zip(bounds, histogram.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(histogram.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {histogram.count}")
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  bounds: Iterable[float] = LatencyHistogram.DEFAULT_BOUNDS) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, bounds=bounds)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, cls, name, help, labelnames, **kwargs):
+        # registering the same metric again returns the existing one so several
+        # components can share a registry
+        metric = self._metrics.get(name)
+        if metric is not None:
+            if type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels.")
+            return metric
+        metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+        return metric
+
+
+class BotSeries:
+    """A metric shared by several bots, with the `bot` label filled in for one of them."""
+
+    __slots__ = ("metric", "_owner")
+
+    def __init__(self, metric: Metric, owner: "BotMetrics") -> None:
+        self.metric = metric
+        self._owner = owner
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        self.metric.inc(self._owner.bot, *labels, amount=amount)
+
+    def set(self, value: float, *labels) -> None:
+        self.metric.set(value, self._owner.bot, *labels)
+
+    def observe(self, value: float, *labels) -> None:
+        self.metric.observe(value, self._owner.bot, *labels)
+
+    def get(self, *labels):
+        return self.metric.get(self._owner.bot, *labels)
+
+
+class BotMetrics:
+    """
+    The metrics collected by the bot, its gateway and its http client.
+
+    Series of a bot are labelled with its name, so many bots can share a registry.
+    A bot without a name is labelled with a placeholder until READY arrives and
+    with its user id after that, the series recorded so far move to the new label.
+    The event loop metrics are per process and not labelled.
+    """
+
+    _unnamed = count(1)
+
+    def __init__(self, registry: MetricsRegistry, bot: Optional[str] = None) -> None:
+        self.registry = registry
+        self.bot = bot if bot is not None else f"unnamed-{next(BotMetrics._unnamed)}"
+        self.named = bot is not None
+
+        self.heartbeat_latency = self._series(registry.histogram(
+            "diskordpie_heartbeat_latency_seconds", "Time between sending a heartbeat and receiving its ack.",
+            ("bot",), bounds=(0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+        ))
+        self.last_heartbeat_latency = self._series(registry.gauge(
+            "diskordpie_heartbeat_last_latency_seconds", "Latency of the most recently acked heartbeat.", ("bot",)
+        ))
+        self.events = self._series(registry.counter(
+            "diskordpie_gateway_events_total", "Dispatched gateway events.", ("bot", "type")
+        ))
+        self.reconnects = self._series(registry.counter(
+            "diskordpie_gateway_reconnects_total", "Gateway reconnects by close code and whether they resumed.",
+            ("bot", "close_code", "resume"),
+        ))
+        self.disconnects = self._series(registry.counter(
+            "diskordpie_gateway_disconnects_total", "Gateway connections lost for good.", ("bot", "close_code")
+        ))
+        self.rate_limited = self._series(registry.counter(
+            "diskordpie_http_rate_limited_total", "Requests answered with 429.", ("bot", "route", "scope")
+        ))
+        self.rate_limit_sleep = self._series(registry.counter(
+            "diskordpie_rate_limit_sleep_seconds_total", "Time spent sleeping in rate limiters.", ("bot", "limiter")
+        ))
+        self.loop_lag = registry.histogram(
+            "diskordpie_event_loop_lag_seconds", "How late the event loop runs scheduled callbacks.",
+            bounds=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+        )
+        self.last_loop_lag = registry.gauge(
+            "diskordpie_event_loop_last_lag_seconds", "The most recently measured event loop lag."
+        )
+        self.loop_stalls = registry.counter(
+            "diskordpie_event_loop_stalls_total", "Times the watchdog saw the event loop blocked, by task.", ("owner",)
+        )
+        self.loop_stall_seconds = registry.counter(
+            "diskordpie_event_loop_stall_seconds_total", "Time the event loop was blocked, by task.", ("owner",)
+        )
+
+    def rename(self, bot: str) -> None:
+        """Labels the bot's series with `bot` from now on, including those recorded so far."""
+        self.named = True
+        if bot == self.bot:
+            return
+        for series in vars(self).values():
+            if isinstance(series, BotSeries):
+                series.metric._relabel(self.bot, bot)
+        self.bot = bot
+
+    def _series(self, metric: Metric) -> BotSeries:
+        return BotSeries(metric, self)
+
+
+class MetricsExporter(Exporter):
+    """Tracing exporter feeding the interaction traces to a metrics registry."""
+
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self._latency = registry.histogram(
+            "diskordpie_interaction_latency_seconds", "Interaction latency by bot, command and stage.",
+            ("bot", "command", "stage"),
+        )
+
+    def export(self, trace: InteractionTrace) -> None:
+        for stage, seconds in trace.stages.items():
+            self._latency.observe(seconds, trace.bot, trace.command, stage)
+        self._latency.observe(trace.total, trace.bot, trace.command, "total")
+
+
+class LoopLagMonitor:
+    """Measures how much later than requested a sleeping task wakes up."""
+
+    def __init__(self, metrics: BotMetrics, interval: float = 0.5) -> None:
+        self._metrics = metrics
+        self._interval = interval
+        self._task = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self._interval)
+            lag = max(time.perf_counter() - start - self._interval, 0.0)
+            self._metrics.loop_lag.observe(lag)
+            self._metrics.last_loop_lag.set(lag)
+
+
+class MetricsServer:
+    """Serves the registry on `http://host:port/metrics` in the Prometheus text format."""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9090) -> None:
+        self._registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self) -> None:
+        # the server is optional so don't pay for importing it unless it is used
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        _logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+        return web.Response(body=self._registry.render().encode(),
+                            headers={ "Content-Type": "text/plain; version=0.0.4; charset=utf-8" })
@@ -0,0 +1,300 @@
+import asyncio
+import glob
+import logging
+import os
+import queue
+import re
+import struct
+import threading
+import time
+
+from itertools import count
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from .gateway import Gateway, GatewayDisconnected, ReconnectGateway, OpCode
+from .http import HttpClient
+from .utils import to_dict
+
+__all__ = [ "GatewayRecorder", "read_recording", "ReplayGateway", "OfflineHttpClient", "replay" ]
+
+_logger = logging.getLogger(__name__)
+
+# A recording file starts with MAGIC followed by records of
+# (unix time as float64, payload length as uint32, payload) in little endian.
+MAGIC = b"DPREC\x01"
+_RECORD_HEADER = struct.Struct("<dI")
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class GatewayRecorder:
+    """
+    Appends the raw frames received by the gateway to recording files.
+
+    `write` only queues the frame, the files are written and compressed by a
+    background thread so large frames don't hold up the event loop. A new file
+    is started once `max_bytes` of frames were written to the current one.
+    """
+
+    # queued by flush and close in place of a frame
+    _FLUSH = object()
+    _CLOSE = object()
+
+    def __init__(self, path: str, max_bytes: int = 64 * 2**20, compress: bool = False, compress_level: int = 6) -> None:
+        self._prefix = path
+        self._max_bytes = max_bytes
+        self._compress = compress
+        self._compress_level = compress_level
+        self._file = None
+        self._written = 0
+        self._index = count(self._first_free_index())
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+        self.files: List[str] = []
+
+    def write(self, frame: Union[str, bytes]) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="diskordpie-recorder", daemon=True)
+            self._thread.start()
+        self._queue.put((time.time(), frame))
+
+    def flush(self) -> None:
+        """Makes the writer thread flush the frames queued so far, without waiting for it."""
+        if self._thread is not None:
+            self._queue.put(GatewayRecorder._FLUSH)
+
+    def close(self) -> None:
+        """Writes the queued frames and closes the file, blocks until it's done."""
+        if self._thread is None:
+            return
+        self._queue.put(GatewayRecorder._CLOSE)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is GatewayRecorder._CLOSE:
+                    self._close_file()
+                    return
+                if item is GatewayRecorder._FLUSH:
+                    if self._file:
+                        self._file.flush()
+                    continue
+                self._write(*item)
+            except Exception:
+                _logger.exception("Failed to write the gateway recording.")
+
+    def _write(self, timestamp: float, frame: Union[str, bytes]) -> None:
+        if isinstance(frame, str):
+            frame = frame.encode()
+
+        if self._file is None or self._written >= self._max_bytes:
+            self._rotate()
+
+        self._file.write(_RECORD_HEADER.pack(timestamp, len(frame)))
+        self._file.write(frame)
+        self._written += _RECORD_HEADER.size + len(frame)
+
+    def _close_file(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _file_name(self, index: int) -> str:
+        return f"{self._prefix}.{index:04}.dprec" + (".gz" if self._compress else "")
+
+    def _first_free_index(self) -> int:
+        # other files sharing the prefix, like "rec.old.0000.dprec", don't count
+        pattern = re.compile(re.escape(self._prefix) + r"\.(\d+)\.dprec(\.gz)?")
+        indices = []
+        for name in glob.glob(glob.escape(self._prefix) + ".*.dprec*"):
+            match = pattern.fullmatch(name)
+            if match:
+                indices.append(int(match.group(1)))
+        return max(indices) + 1 if indices else 0
+
+    def _rotate(self) -> None:
+        self._close_file()
+
+        name = self._file_name(next(self._index))
+        directory = os.path.dirname(name)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if self._compress:
+            import gzip
+            self._file = gzip.open(name, "wb", compresslevel=self._compress_level)
+        else:
+            self._file = open(name, "wb")
+
+        self._file.write(MAGIC)
+        self._written = 0
+        self.files.append(name)
+        _logger.info(f"Recording gateway traffic to {name}")
+
+
+def _open_recording(path: str):
+    with open(path, "rb") as f:
+        compressed = f.read(2) == _GZIP_MAGIC
+    if compressed:
+        import gzip
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_recording(paths: Union[str, Iterable[str]]) -> Iterator[Tuple[float, bytes]]:
+    """
+    Yields the (unix time, frame) pairs stored in the recordings.
+
+    `paths` can be a file, a glob pattern or a list of them. Matched files are
+    read in the order of their names, which is the order they were written in.
+    """
+    if isinstance(paths, str):
+        paths = [ paths ]
+
+    files = []
+    for pattern in paths:
+        matched = sorted(glob.glob(pattern))
+        files.extend(matched if matched else [ pattern ])
+
+    for path in files:
+        with _open_recording(path) as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a gateway recording.")
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    # a recording which was not closed properly can end with a partial record
+                    break
+                timestamp, length = _RECORD_HEADER.unpack(header)
+                frame = f.read(length)
+                if len(frame) < length:
+                    break
+                yield timestamp, frame
+
+
+class ReplayGateway(Gateway):
+    """
+    A gateway receiving its frames from recordings instead of a websocket.
+
+    With `speed` set the frames are delivered at the recorded pace multiplied by
+    `speed`, otherwise as fast as possible. Nothing is ever sent.
+    """
+
+    def __init__(self, paths: Union[str, Iterable[str]], speed: Optional[float] = None, **kwargs) -> None:
+        super().__init__(None, None, **kwargs)
+        self._frames = read_recording(paths)
+        self._speed = speed
+        self._first_recorded = None
+        self._started = None
+
+        self.frames = 0
+
+    async def connect(self, token=None, resume=False) -> None:
+        return
+
+    async def send(self, data, priority=False):
+        return
+
+    async def close(self):
+        return
+
+    async def _receive(self):
+        while True:
+            try:
+                timestamp, frame = next(self._frames)
+            except StopIteration:
+                raise GatewayDisconnected()
+
+            await self._pace(timestamp)
+            self.frames += 1
+            data = self._decode(frame)
+            # the live gateway consumes HELLO while connecting
+            if data["op"] != OpCode.HELLO:
+                return data
+
+    async def _pace(self, timestamp: float) -> None:
+        if self._speed:
+            if self._first_recorded is None:
+                self._first_recorded = timestamp
+                self._started = time.perf_counter()
+            due = self._started + (timestamp - self._first_recorded) / self._speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+
+class OfflineHttpClient(HttpClient):
+    """Answers every request locally so replayed events never reach discord."""
+
+    def __init__(self) -> None:
+        super().__init__(None)
+        self._token = "offline"
+        self._ids = count(1)
+
+    async def send_request(self, method: str, path: str, json_data=None, headers=None, params=None, trace=None):
+        _logger.debug(f"Offline {method}:{path}")
+        if method not in ("POST", "PUT", "PATCH"):
+            return None
+        # echo the payload back as if discord created it
+        payload = to_dict(json_data) if json_data is not None else {}
+        if isinstance(payload, list):
+            return [ self._created(item) for item in payload ]
+        return self._created(payload)
+
+    def _created(self, payload: dict) -> dict:
+        created = dict(payload)
+        created.setdefault("id", str(next(self._ids)))
+        return created
+
+
+class ReplayStats:
+
+    def __init__(self, frames: int, events: int, elapsed: float) -> None:
+        self.frames = frames
+        self.events = events
+        self.elapsed = elapsed
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return f"ReplayStats{{frames={self.frames}, events={self.events}, elapsed={self.elapsed:.3f}s, " \
+               f"events_per_second={self.events_per_second:.0f}}}"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+async def replay(bot, paths: Union[str, Iterable[str]], speed: Optional[float] = None) -> ReplayStats:
+    """
+    Feeds recorded frames through `Gateway.next_event` and `Bot._dispatch_event`
+    without any network access. Returns once the recordings are exhausted and the
+    handlers they started have finished.
+    """
+    from .members import MemberChunker
+
+    bot._http = OfflineHttpClient()
+    bot._gateway = ReplayGateway(paths, speed, tracer=bot.tracer, metrics=bot.metrics)
+    bot._chunker = MemberChunker(bot._gateway, bot.cache)
+
+    events = 0
+    start = time.perf_counter()
+    while True:
+        try:
+            event = await bot._gateway.next_event()
+        except GatewayDisconnected:
+            break
+        except ReconnectGateway:
+            # the recording goes on with the frames of the next connection
+            continue
+        await bot._dispatch_event(event)
+        events += 1
+
+    if bot._events._tasks:
+        await asyncio.gather(*bot._events._tasks, return_exceptions=True)
+
+    return ReplayStats(bot._gateway.frames, events, time.perf_counter() - start)
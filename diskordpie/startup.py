@@ -0,0 +1,70 @@
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+__all__ = [ "StartupReport" ]
+
+
+class StartupReport:
+    """
+    When each step of bringing the bot up finished, in seconds since `Bot.start`.
+
+    The steps overlap: commands are synced while the gateway connects, so the
+    times are not meant to add up. `identify` is the one span in between two
+    steps, from sending IDENTIFY until READY arrived.
+    """
+
+    IMPORT = "import"
+    # gateway url fetched, websocket open, HELLO received and IDENTIFY sent
+    CONNECT = "connect"
+    # READY received
+    READY = "ready"
+    # the commands are registered with discord and can be invoked
+    COMMANDS = "first-command-ready"
+
+    def __init__(self, import_time: float = 0.0, started_at: float = None) -> None:
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.steps: Dict[str, float] = { StartupReport.IMPORT: import_time }
+
+    def mark(self, step: str) -> None:
+        # only the first time counts, READY also arrives after every re-identify
+        if step not in self.steps:
+            self.steps[step] = time.perf_counter() - self.started_at
+
+    def get(self, step: str) -> Optional[float]:
+        return self.steps.get(step)
+
+    @property
+    def identify(self) -> Optional[float]:
+        connect = self.get(StartupReport.CONNECT)
+        ready = self.get(StartupReport.READY)
+        return ready - connect if connect is not None and ready is not None else None
+
+    def _rows(self) -> List[Tuple[str, float, str]]:
+        rows = []
+        for step, seconds, note in (
+            (StartupReport.IMPORT, self.get(StartupReport.IMPORT), "diskordpie and aiohttp"),
+            (StartupReport.CONNECT, self.get(StartupReport.CONNECT), "gateway url, websocket, HELLO, IDENTIFY"),
+            ("identify", self.identify, "IDENTIFY sent until READY"),
+            (StartupReport.COMMANDS, self.get(StartupReport.COMMANDS), "since start, alongside connecting"),
+        ):
+            if seconds is not None:
+                rows.append( (step, seconds, note) )
+        return rows
+
+    def breakdown(self) -> str:
+        """The report as a small table, as printed by `Bot.run`."""
+        done = [ seconds for seconds in (self.get(StartupReport.READY), self.get(StartupReport.COMMANDS))
+                 if seconds is not None ]
+        total = self.get(StartupReport.IMPORT) + max(done, default=0.0)
+        lines = [ f"Bot started in {total * 1000:.1f}ms:" ]
+        for step, seconds, note in self._rows():
+            lines.append(f"  {step:<20} {seconds * 1000:8.1f}ms  {note}")
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        steps = ", ".join(f"{step}={seconds * 1000:.1f}ms" for step, seconds, _ in self._rows())
+        return f"StartupReport{{{steps}}}"
+
+    def __repr__(self) -> str:
+        return str(self)
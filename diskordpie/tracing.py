@@ -0,0 +1,178 @@
+import logging
+import time
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .utils import snowflake_timestamp
+
+__all__ = [ "Tracer", "InteractionTrace", "Exporter", "LoggingExporter", "HistogramExporter", "LatencyHistogram" ]
+
+_logger = logging.getLogger(__name__)
+
+
+class InteractionTrace:
+    """
+    Timings of one interaction from the moment its frame arrived until its handler returned.
+
+    Durations are in seconds and keyed by stage. Stages which can happen several
+    times, like the rate limit waits of multiple requests, are summed.
+    """
+
+    # the time discord took to deliver the frame, computed from the interaction id,
+    # so it is only as precise as our clock is synchronized with discord's
+    GATEWAY = "gateway"
+    DECODE = "decode"
+    # from decoding the frame until the handler task starts running: dispatching the
+    # event and waiting for the loop to schedule the task
+    QUEUE = "queue"
+    # matching the interaction options to the command arguments
+    ROUTING = "routing"
+    HANDLER = "handler"
+    BUCKET_WAIT = "bucket_wait"
+    GLOBAL_WAIT = "global_wait"
+    HTTP = "http"
+
+    __slots__ = ("interaction_id", "bot", "command", "received_at", "stages", "_mark")
+
+    def __init__(self, interaction_id: int, received_at: float, decode_time: float, bot: str = None) -> None:
+        self.interaction_id = interaction_id
+        # name of the bot which received the interaction, bots can share a tracer
+        self.bot = bot
+        self.command = None
+        # perf_counter time of the frame arrival
+        self.received_at = received_at
+        self.stages: Dict[str, float] = {}
+
+        delay = time.time() - (time.perf_counter() - received_at) - snowflake_timestamp(interaction_id)
+        self.stages[InteractionTrace.GATEWAY] = max(delay, 0.0)
+        self.stages[InteractionTrace.DECODE] = decode_time
+        self._mark = received_at + decode_time
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def mark(self, stage: str) -> None:
+        """Records the time since the previous mark as `stage`."""
+        now = time.perf_counter()
+        self.add(stage, now - self._mark)
+        self._mark = now
+
+    @property
+    def total(self) -> float:
+        """Time from the frame arrival until now or until the last mark."""
+        return self._mark - self.received_at
+
+    def __str__(self) -> str:
+        stages = ", ".join(f"{stage}={seconds * 1000:.2f}ms" for stage, seconds in self.stages.items())
+        return f"InteractionTrace{{bot={self.bot}, command={self.command}, total={self.total * 1000:.2f}ms, {stages}}}"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+class Exporter(ABC):
+
+    @abstractmethod
+    def export(self, trace: InteractionTrace) -> None:
+        ...
+
+
+class LoggingExporter(Exporter):
+
+    def __init__(self, level=logging.INFO, threshold: float = 0.0) -> None:
+        self._level = level
+        self._threshold = threshold
+
+    def export(self, trace: InteractionTrace) -> None:
+        if trace.total >= self._threshold:
+            _logger.log(self._level, str(trace))
+
+
+class LatencyHistogram:
+
+    DEFAULT_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, bounds: Iterable[float] = DEFAULT_BOUNDS) -> None:
+        self.bounds = tuple(bounds)
+        # the last bucket counts everything above the largest bound
+        self.counts = [ 0 ] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+    def __str__(self) -> str:
+        return f"LatencyHistogram{{count={self.count}, p50={self.quantile(0.5)}, p99={self.quantile(0.99)}}}"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+class HistogramExporter(Exporter):
+    """Keeps a latency histogram of every command of every bot, for the total time and for every stage."""
+
+    def __init__(self, bounds: Iterable[float] = LatencyHistogram.DEFAULT_BOUNDS) -> None:
+        self._bounds = tuple(bounds)
+        # (bot, command name) -> stage ("total" for the whole interaction) -> histogram
+        self.histograms: Dict[Tuple[str, str], Dict[str, LatencyHistogram]] = {}
+
+    def export(self, trace: InteractionTrace) -> None:
+        key = (trace.bot, trace.command)
+        per_stage = self.histograms.get(key)
+        if per_stage is None:
+            per_stage = self.histograms[key] = {}
+
+        for stage, seconds in trace.stages.items():
+            self._histogram(per_stage, stage).observe(seconds)
+        self._histogram(per_stage, "total").observe(trace.total)
+
+    def _histogram(self, per_stage: Dict[str, LatencyHistogram], stage: str) -> LatencyHistogram:
+        histogram = per_stage.get(stage)
+        if histogram is None:
+            histogram = per_stage[stage] = LatencyHistogram(self._bounds)
+        return histogram
+
+
+class Tracer:
+    """
+    Creates traces of interactions and hands the finished ones to the exporters.
+
+    A tracer without exporters is disabled and no timing is done at all.
+    """
+
+    def __init__(self, exporters: Optional[List[Exporter]] = None) -> None:
+        self.exporters: List[Exporter] = list(exporters) if exporters else []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter: Exporter) -> None:
+        self.exporters.append(exporter)
+
+    def start(self, interaction_id: int, received_at: float, decode_time: float, bot: str = None) -> InteractionTrace:
+        return InteractionTrace(interaction_id, received_at, decode_time, bot)
+
+    def finish(self, trace: InteractionTrace) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception:
+                _logger.exception(f"Exporter {type(exporter).__name__} failed.")
@@ -1,38 +1,93 @@
 import json
-import inspect
+from datetime import datetime, timezone
 from enum import Enum
+from typing import Optional
+
+# the first second of 2015 in milliseconds
+DISCORD_EPOCH = 1420070400000
+
+def parse_snowflake(value) -> Optional[int]:
+    return int(value) if value is not None else None
+
+def snowflake_timestamp(snowflake: int) -> float:
+    """Unix time in seconds at which the snowflake was generated."""
+    return ((int(snowflake) >> 22) + DISCORD_EPOCH) / 1000
+
+def snowflake_time(snowflake: int) -> datetime:
+    return datetime.fromtimestamp(snowflake_timestamp(snowflake), tz=timezone.utc)
+
+def time_snowflake(dt: datetime) -> int:
+    """The smallest snowflake which could have been generated at the given time."""
+    return (int(dt.timestamp() * 1000) - DISCORD_EPOCH) << 22
+
+class Field:
+    """
+    Describes how an attribute is written to json.
+
+    Plain attributes can be listed in `_json_fields` just by name, `Field` is
+    needed for enums, nested entities and attributes stored under another key.
+    """
+
+    __slots__ = ("attr", "key", "enum", "nested")
+
+    def __init__(self, attr: str, key: str = None, *, enum: bool = False, nested: bool = False) -> None:
+        self.attr = attr
+        self.key = key if key else attr
+        self.enum = enum
+        self.nested = nested
+
+
+# compiled encoders by class
+_encoders = {}
+
+def _compile_encoder(cls):
+    fields = [ f if isinstance(f, Field) else Field(f) for f in cls._json_fields ]
+
+    lines = [ "def encode(obj):", "    d = {}" ]
+    for f in fields:
+        lines.append(f"    v = obj.{f.attr}")
+        lines.append(f"    if v is not None:")
+        if f.enum:
+            lines.append(f"        d[{f.key!r}] = v.value if isinstance(v, Enum) else v")
+        elif f.nested:
+            lines.append(f"        d[{f.key!r}] = _encode_value(v)")
+        else:
+            lines.append(f"        d[{f.key!r}] = v")
+    lines.append("    return d")
+
+    namespace = { "Enum": Enum, "_encode_value": _encode_value }
+    exec("\n".join(lines), namespace)
+
+    encode = namespace["encode"]
+    encode.__qualname__ = f"encode_{cls.__name__}"
+    _encoders[cls] = encode
+    return encode
+
+def _encode_value(value):
+    encode = _encoders.get(type(value))
+    if encode:
+        return encode(value)
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        # enums are ints or strings too
+        return value.value if isinstance(value, Enum) else value
+    if isinstance(value, (list, tuple)):
+        return [ _encode_value(v) for v in value ]
+    if isinstance(value, dict):
+        return { k: _encode_value(v) for k, v in value.items() }
+    if hasattr(type(value), "_json_fields"):
+        return _compile_encoder(type(value))(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable.")
 
 def to_dict(obj):
-    res = {}
-    
-    for k in obj.__dict__:
-        if k.startswith("_") or k.endswith("_"):
-            continue
-        
-        thing = obj.__dict__[k]
-        if inspect.ismethod(thing):
-            continue
-
-        if isinstance(thing, list):
-            arr = []
-            for val in thing:
-                if inspect.isbuiltin(val):
-                    arr.append(val)
-                else:
-                    arr.append(to_dict(val))
-            res[k] = arr
-            continue
-        
-        module = inspect.getmodule(thing)
-        #print(k, module)
-
-        # recursively serialize only classes from our library
-        if module and module.__name__.startswith("diskordpie"):
-            thing = to_dict(thing)
-
-        res[k] = thing
-
-    return res
+    """
+    Converts an entity declaring `_json_fields` to a dict ready to be sent to discord.
+
+    The encoder for every class is generated once on first use. Attributes set
+    to `None` are left out. Plain dicts are copied with their values encoded.
+    """
+    return _encode_value(obj)
 
 def to_json(obj, indent=None):
     return json.dumps(to_dict(obj), indent=indent)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from collections import Counter, deque
+from typing import Deque, List, Optional, Tuple
+
+__all__ = [ "LoopWatchdog", "Stall" ]
+
+_logger = logging.getLogger(__name__)
+
+
+class Stall:
+    """A period in which the event loop didn't get to run its callbacks."""
+
+    __slots__ = ("owner", "started_at", "duration", "stack", "samples")
+
+    def __init__(self, owner: str, started_at: float, stack: List[str]) -> None:
+        # name of the task which was running when the stall was detected
+        self.owner = owner
+        # perf_counter time the loop was expected to run again
+        self.started_at = started_at
+        self.duration = 0.0
+        self.stack = stack
+        # stack -> how often it was seen while sampling
+        self.samples: Counter = Counter()
+
+    def profile(self, limit: int = 5) -> List[Tuple[float, Tuple[str, ...]]]:
+        """The most frequently sampled stacks with their share of the samples."""
+        total = sum(self.samples.values())
+        return [ (count / total, stack) for stack, count in self.samples.most_common(limit) ]
+
+    def __str__(self) -> str:
+        return f"Stall{{owner={self.owner}, duration={self.duration * 1000:.1f}ms}}"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+
+class LoopWatchdog:
+    """
+    Watches the event loop from a separate thread and reports what blocked it.
+
+    A task on the loop ticks every `interval` seconds. When the thread sees no tick
+    for longer than `interval + threshold` it captures the stack of the loop thread
+    and the task running on it. With `sample_interval` set it keeps sampling the
+    stack until the loop recovers, building a small profile of the stall.
+
+    Stalls are logged when detected, and again with their duration once they end.
+    The durations are counted in the bot metrics by the name of the task, which is
+    the command or listener for handlers started by the bot.
+    """
+
+    def __init__(self, threshold: float = 0.25, *, interval: float = 0.1, sample_interval: Optional[float] = None,
+                 metrics=None, history: int = 100) -> None:
+        self.threshold = threshold
+        self.metrics = metrics
+        self.stalls: Deque[Stall] = deque(maxlen=history)
+
+        self._interval = interval
+        self._sample_interval = sample_interval
+        self._loop = None
+        self._loop_thread = None
+        self._last_tick = 0.0
+        self._tick_task = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        """Starts watching the running loop."""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.perf_counter()
+        self._stopping.clear()
+        self._tick_task = self._loop.create_task(self._tick(), name="diskordpie watchdog")
+        self._thread = threading.Thread(target=self._watch, name="diskordpie-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._tick_task.cancel()
+        try:
+            await self._tick_task
+        except asyncio.CancelledError:
+            pass
+        # the thread wakes up at least every poll interval
+        await self._loop.run_in_executor(None, self._thread.join)
+        self._thread = None
+        self._tick_task = None
+
+    async def _tick(self) -> None:
+        while True:
+            self._last_tick = time.perf_counter()
+            await asyncio.sleep(self._interval)
+
+    def _watch(self) -> None:
+        poll = min(self._sample_interval or self._interval, self._interval)
+        stall = None
+        stalled_tick = None
+
+        while not self._stopping.wait(poll):
+            tick = self._last_tick
+
+            if stall is not None:
+                if tick != stalled_tick:
+                    stall.duration = max(tick - stall.started_at, 0.0)
+                    self._loop.call_soon_threadsafe(self._finish, stall)
+                    stall = None
+                elif self._sample_interval:
+                    stall.samples[self._sample()] += 1
+                continue
+
+            expected = tick + self._interval
+            if time.perf_counter() - expected >= self.threshold:
+                stall = self._detect(expected)
+                stalled_tick = tick
+
+    def _loop_frame(self):
+        return sys._current_frames().get(self._loop_thread)
+
+    def _sample(self) -> Tuple[str, ...]:
+        frame = self._loop_frame()
+        stack = []
+        while frame is not None:
+            stack.append(_format_frame(frame))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def _detect(self, started_at: float) -> Stall:
+        task = asyncio.current_task(self._loop)
+        owner = task.get_name() if task is not None else "callback"
+
+        frame = self._loop_frame()
+        stack = traceback.format_stack(frame) if frame is not None else []
+        stall = Stall(owner, started_at, stack)
+        _logger.warning(f"Event loop blocked for over {self.threshold * 1000:.0f}ms by {owner}:\n{''.join(stack)}")
+        return stall
+
+    def _finish(self, stall: Stall) -> None:
+        self.stalls.append(stall)
+
+        message = f"Event loop was blocked for {stall.duration * 1000:.1f}ms by {stall.owner}."
+        for share, stack in stall.profile():
+            message += f"\n  {share:6.1%} {' <- '.join(reversed(stack[-3:]))}"
+        _logger.warning(message)
+
+        if self.metrics is not None:
+            # default task names are unique so don't let them into the labels
+            owner = "other" if stall.owner.startswith("Task-") else stall.owner
+            self.metrics.loop_stalls.inc(owner)
+            self.metrics.loop_stall_seconds.inc(owner, amount=stall.duration)
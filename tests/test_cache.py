@@ -0,0 +1,125 @@
+from diskordpie.cache import Cache
+
+
+GUILD_ID = "100"
+OTHER_GUILD_ID = "200"
+
+
+def member(user_id: int) -> dict:
+    return { "user": { "id": str(user_id), "username": f"user{user_id}", "discriminator": "0001" }, "roles": [] }
+
+
+def guild_create(guild_id: str, members=()) -> dict:
+    return {
+        "id": guild_id,
+        "name": "guild",
+        "channels": [ { "id": guild_id + "1", "type": 0, "name": "general" } ],
+        "roles": [ { "id": guild_id + "2", "name": "everyone", "permissions": "0" } ],
+        "members": [ member(user_id) for user_id in members ],
+    }
+
+
+def test_guild_create_stores_channels_roles_and_members():
+    cache = Cache()
+    cache.apply("GUILD_CREATE", guild_create(GUILD_ID, members=[ 1, 2 ]))
+
+    guild = cache.get_guild(GUILD_ID)
+    assert guild.channel_ids == { 1001 }
+    assert guild.role_ids.keys() == { 1002 }
+    assert guild.member_ids == { 1, 2 }
+    assert cache.get_channel("1001").guild_id == 100
+    assert cache.get_member(GUILD_ID, 2).user is cache.get_user(2)
+
+
+def test_guild_delete_drops_only_its_own_entities():
+    cache = Cache()
+    cache.apply("GUILD_CREATE", guild_create(GUILD_ID, members=[ 1, 2 ]))
+    cache.apply("GUILD_CREATE", guild_create(OTHER_GUILD_ID, members=[ 2, 3 ]))
+
+    cache.apply("GUILD_DELETE", { "id": GUILD_ID })
+
+    assert cache.get_guild(GUILD_ID) is None
+    assert cache.get_channel("1001") is None
+    assert cache.get_role("1002") is None
+    assert cache.get_member(GUILD_ID, 1) is None
+    assert cache.get_member(GUILD_ID, 2) is None
+    assert cache.get_member(OTHER_GUILD_ID, 2) is not None
+    assert cache.get_channel("2001") is not None
+
+
+def test_unavailable_guild_keeps_its_entities():
+    cache = Cache()
+    cache.apply("GUILD_CREATE", guild_create(GUILD_ID, members=[ 1 ]))
+
+    cache.apply("GUILD_DELETE", { "id": GUILD_ID, "unavailable": True })
+
+    assert cache.get_guild(GUILD_ID).unavailable
+    assert cache.get_member(GUILD_ID, 1) is not None
+
+
+def test_member_remove_updates_the_guild_index():
+    cache = Cache()
+    cache.apply("GUILD_CREATE", guild_create(GUILD_ID, members=[ 1, 2 ]))
+
+    cache.apply("GUILD_MEMBER_REMOVE", { "guild_id": GUILD_ID, "user": { "id": "1" } })
+
+    assert cache.get_member(GUILD_ID, 1) is None
+    assert cache.get_guild(GUILD_ID).member_ids == { 2 }
+
+
+def test_evicted_members_leave_the_guild_index():
+    cache = Cache(members=2)
+    cache.apply("GUILD_CREATE", guild_create(GUILD_ID))
+    cache.apply("GUILD_MEMBERS_CHUNK", { "guild_id": GUILD_ID, "members": [ member(1), member(2), member(3) ] })
+
+    assert cache.get_member(GUILD_ID, 1) is None
+    assert cache.get_guild(GUILD_ID).member_ids == { 2, 3 }
+    assert cache.members.evictions == 1
+
+
+def test_member_update_follows_a_user_stored_again():
+    cache = Cache(users=1)
+    cache.apply("GUILD_CREATE", guild_create(GUILD_ID, members=[ 5 ]))
+    cache.apply("USER_UPDATE", { "id": "6", "username": "other" })
+
+    data = member(5)
+    data["user"]["username"] = "renamed"
+    cache.apply("GUILD_MEMBER_UPDATE", dict(data, guild_id=GUILD_ID))
+
+    assert cache.get_member(GUILD_ID, 5).user is cache.get_user(5)
+    assert cache.get_member(GUILD_ID, 5).user.username == "renamed"
+
+
+def test_guild_delete_without_cached_guilds_still_drops_members():
+    cache = Cache(guilds=False)
+    cache.apply("GUILD_CREATE", guild_create(GUILD_ID, members=[ 1 ]))
+
+    cache.apply("GUILD_DELETE", { "id": GUILD_ID })
+
+    assert cache.get_member(GUILD_ID, 1) is None
+
+
+def test_evicted_channels_and_roles_leave_the_guild_index():
+    cache = Cache(channels=1, roles=1)
+    data = guild_create(GUILD_ID)
+    data["channels"].append({ "id": "1003", "type": 0, "name": "random" })
+    data["roles"].append({ "id": "1004", "name": "mods", "permissions": "0" })
+    cache.apply("GUILD_CREATE", data)
+
+    guild = cache.get_guild(GUILD_ID)
+    assert cache.get_channel("1001") is None
+    assert guild.channel_ids == { 1003 }
+    assert cache.get_role("1002") is None
+    assert guild.role_ids.keys() == { 1004 }
+
+
+def test_members_share_the_guild_role_ids():
+    cache = Cache()
+    cache.apply("GUILD_CREATE", guild_create(GUILD_ID))
+    data = dict(member(1), roles=[ "1002" ], joined_at="2021-09-28T18:27:07.523000+00:00")
+    cache.apply("GUILD_MEMBER_ADD", dict(data, guild_id=GUILD_ID))
+
+    cached = cache.get_member(GUILD_ID, 1)
+    assert cached.roles == (1002,)
+    assert cached.roles[0] is cache.get_role("1002").id
+    assert cached.joined_at.isoformat() == "2021-09-28T18:27:07.523000+00:00"
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+import diskordpie
+
+from diskordpie.events import EventRegistry
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_listeners_only_receive_their_event_type():
+    async def main():
+        registry = EventRegistry()
+        received = []
+
+        async def on_message(data):
+            received.append(("message", data["id"]))
+
+        async def on_guild(data):
+            received.append(("guild", data["id"]))
+
+        registry.add_listener("MESSAGE_CREATE", on_message)
+        registry.add_listener("GUILD_CREATE", on_guild)
+
+        registry.dispatch("MESSAGE_CREATE", { "id": "1" })
+        registry.dispatch("GUILD_CREATE", { "id": "2" })
+        registry.dispatch("TYPING_START", { "id": "3" })
+        await asyncio.gather(*registry._tasks)
+        return received
+
+    assert sorted(run(main())) == [ ("guild", "2"), ("message", "1") ]
+
+
+def test_removed_listener_is_not_called():
+    async def main():
+        registry = EventRegistry()
+        calls = []
+
+        async def listener(data):
+            calls.append(data)
+
+        registry.add_listener("MESSAGE_CREATE", listener)
+        registry.remove_listener("MESSAGE_CREATE", listener)
+        registry.dispatch("MESSAGE_CREATE", {})
+        await asyncio.sleep(0)
+        return calls, registry._listeners
+
+    calls, listeners = run(main())
+    assert calls == []
+    assert listeners == {}
+
+
+def test_listener_has_to_be_async():
+    with pytest.raises(TypeError):
+        EventRegistry().add_listener("MESSAGE_CREATE", lambda data: None)
+
+
+def test_wait_for_by_key_only_sees_its_key():
+    async def main():
+        registry = EventRegistry()
+        waiter = asyncio.create_task(registry.wait_for("MESSAGE_CREATE", key=10))
+        await asyncio.sleep(0)
+
+        registry.dispatch("MESSAGE_CREATE", { "id": "1", "channel_id": "20" })
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        registry.dispatch("MESSAGE_CREATE", { "id": "2", "channel_id": "10" })
+        result = await waiter
+        return result, registry._waiters
+
+    result, waiters = run(main())
+    assert result["id"] == "2"
+    assert waiters == {}
+
+
+def test_wait_for_without_key_sees_every_event_of_its_type():
+    async def main():
+        registry = EventRegistry()
+        waiter = asyncio.create_task(registry.wait_for("MESSAGE_CREATE", check=lambda d: d["id"] == "2"))
+        await asyncio.sleep(0)
+
+        registry.dispatch("MESSAGE_CREATE", { "id": "1", "channel_id": "20" })
+        registry.dispatch("MESSAGE_CREATE", { "id": "2", "channel_id": "30" })
+        return await waiter
+
+    assert run(main())["id"] == "2"
+
+
+def test_wait_for_by_key_needs_a_key_field():
+    with pytest.raises(ValueError):
+        run(EventRegistry().wait_for("READY", key=1))
+
+
+def test_wait_for_timeout_removes_the_waiter():
+    async def main():
+        registry = EventRegistry()
+        with pytest.raises(asyncio.TimeoutError):
+            await registry.wait_for("MESSAGE_CREATE", timeout=0.01, key=10)
+        return registry._waiters
+
+    assert run(main()) == {}
+
+
+def test_failing_check_is_raised_from_wait_for():
+    def check(data):
+        raise KeyError("nope")
+
+    async def main():
+        registry = EventRegistry()
+        waiter = asyncio.create_task(registry.wait_for("MESSAGE_CREATE", check=check))
+        await asyncio.sleep(0)
+        registry.dispatch("MESSAGE_CREATE", {})
+        with pytest.raises(KeyError):
+            await waiter
+
+    run(main())
+
+
+def test_bot_listen_needs_on_prefix_without_event_type():
+    bot = diskordpie.Bot()
+
+    with pytest.raises(ValueError):
+        @bot.listen()
+        async def handle_message(data):
+            pass
+
+    @bot.listen()
+    async def on_message_create(data):
+        pass
+
+    @bot.listen("MESSAGE_CREATE")
+    async def handle_message(data):
+        pass
+
+    assert bot._events._listeners["MESSAGE_CREATE"] == [ on_message_create, handle_message ]
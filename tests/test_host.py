@@ -0,0 +1,56 @@
+import asyncio
+
+from diskordpie import Bot, BotHost
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class IdleBot(Bot):
+
+    def __init__(self, stops: bool = False, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.stops = stops
+        self.starts = 0
+
+    async def start(self, token, session=None):
+        self.starts += 1
+        if not self.stops:
+            await asyncio.Event().wait()
+
+
+def test_bot_stopping_on_its_own_leaves_the_host():
+    async def main():
+        host = BotHost()
+        bot = IdleBot(stops=True, monitor_loop=False)
+        await host.start()
+        host.add(bot, "token")
+        await asyncio.sleep(0.01)
+
+        assert host.bots == []
+        host.add(bot, "token")
+        await asyncio.sleep(0.01)
+        await host.close()
+        return bot.starts
+
+    assert run(main()) == 2
+
+
+def test_closed_host_starts_its_bots_again():
+    async def main():
+        host = BotHost()
+        bot = IdleBot(monitor_loop=False)
+        host.add(bot, "token")
+
+        await host.start()
+        await asyncio.sleep(0.01)
+        await host.close()
+        assert host.bots == [ bot ]
+
+        await host.start()
+        await asyncio.sleep(0.01)
+        await host.close()
+        return bot.starts
+
+    assert run(main()) == 2
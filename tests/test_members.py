@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from diskordpie.cache import Cache
+from diskordpie.members import MemberChunker
+
+
+GUILD_ID = 100
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class FakeGateway:
+
+    def __init__(self) -> None:
+        self.requests = []
+        self.identify_callbacks = []
+
+    def on_identify(self, callback) -> None:
+        self.identify_callbacks.append(callback)
+
+    def identify(self) -> None:
+        for callback in self.identify_callbacks:
+            callback()
+
+    async def request_guild_members(self, guild_id, nonce, *, query=None, limit=0, user_ids=None, presences=False):
+        self.requests.append( (guild_id, nonce, user_ids) )
+
+
+def member(user_id) -> dict:
+    return { "user": { "id": str(user_id), "username": f"user{user_id}" }, "roles": [] }
+
+
+def chunk(nonce: str, user_ids, index: int = 0, count: int = 1, guild_id: int = GUILD_ID) -> dict:
+    return {
+        "guild_id": str(guild_id),
+        "nonce": nonce,
+        "members": [ member(user_id) for user_id in user_ids ],
+        "chunk_index": index,
+        "chunk_count": count,
+    }
+
+
+def make_chunker(timeout=1):
+    gateway = FakeGateway()
+    return gateway, MemberChunker(gateway, Cache(), timeout=timeout)
+
+
+def test_chunks_are_matched_to_their_request_by_nonce():
+    async def main():
+        gateway, chunker = make_chunker()
+        first = await chunker.request(GUILD_ID)
+        second = await chunker.request(GUILD_ID)
+        (_, first_nonce, _), (_, second_nonce, _) = gateway.requests
+
+        chunker.feed(chunk("someone-else", [ 9 ]))
+        chunker.feed(chunk(second_nonce, [ 2 ]))
+        chunker.feed(chunk(first_nonce, [ 1 ]))
+        return await first.collect(), await second.collect(), chunker._streams
+
+    first, second, streams = run(main())
+    assert [ m.id for m in first ] == [ 1 ]
+    assert [ m.id for m in second ] == [ 2 ]
+    assert streams == {}
+
+
+def test_stream_ends_after_the_last_chunk():
+    async def main():
+        gateway, chunker = make_chunker()
+        stream = await chunker.request(GUILD_ID)
+        (_, nonce, _), = gateway.requests
+
+        chunker.feed(chunk(nonce, [ 1, 2 ], index=0, count=3))
+        chunker.feed(chunk(nonce, [ 3 ], index=1, count=3))
+        assert nonce in chunker._streams
+        chunker.feed(dict(chunk(nonce, [], index=2, count=3), not_found=[ "4" ]))
+        return await stream.collect(), stream.not_found, chunker._streams
+
+    members, not_found, streams = run(main())
+    assert [ m.id for m in members ] == [ 1, 2, 3 ]
+    assert not_found == [ 4 ]
+    assert streams == {}
+
+
+def test_user_ids_are_requested_in_batches_of_100():
+    async def main():
+        gateway, chunker = make_chunker()
+        stream = await chunker.request(GUILD_ID, user_ids=range(250))
+        assert [ len(user_ids) for _, _, user_ids in gateway.requests ] == [ 100, 100, 50 ]
+
+        # the stream only ends once every batch is answered
+        for _, nonce, user_ids in reversed(gateway.requests):
+            chunker.feed(chunk(nonce, user_ids))
+        return await stream.collect()
+
+    members = run(main())
+    assert sorted(m.id for m in members) == list(range(250))
+
+
+def test_identify_fails_pending_streams():
+    async def main():
+        gateway, chunker = make_chunker()
+        stream = await chunker.request(GUILD_ID)
+        gateway.identify()
+        with pytest.raises(RuntimeError):
+            await stream.collect()
+        return chunker._streams
+
+    assert run(main()) == {}
+
+
+def test_timed_out_stream_is_forgotten():
+    async def main():
+        gateway, chunker = make_chunker(timeout=0.01)
+        stream = await chunker.request(GUILD_ID)
+        with pytest.raises(asyncio.TimeoutError):
+            await stream.collect()
+        return chunker._streams
+
+    assert run(main()) == {}
+
+
+def test_request_many_forgets_the_stream_left_early():
+    async def main():
+        gateway, chunker = make_chunker()
+        members = chunker.request_many([ 1, 2, 3 ], max_pending=2)
+        first = asyncio.ensure_future(members.__anext__())
+        await asyncio.sleep(0)
+
+        (_, nonce, _), _ = gateway.requests
+        chunker.feed(chunk(nonce, [ 1, 2 ], count=2, guild_id=1))
+        assert (await first).id == 1
+        await members.aclose()
+        return chunker._streams
+
+    assert run(main()) == {}
@@ -0,0 +1,64 @@
+import time
+
+from diskordpie.metrics import BotMetrics, MetricsRegistry, MetricsExporter
+from diskordpie.tracing import HistogramExporter, Tracer
+
+
+def test_bots_sharing_a_registry_get_their_own_series():
+    registry = MetricsRegistry()
+    first = BotMetrics(registry, "first")
+    second = BotMetrics(registry, "second")
+
+    first.events.inc("READY")
+    second.events.inc("READY")
+    second.last_heartbeat_latency.set(0.5)
+
+    assert first.events.get("READY") == 1
+    assert second.events.get("READY") == 1
+    assert first.last_heartbeat_latency.get() is None
+    assert 'diskordpie_gateway_events_total{bot="second",type="READY"} 1.0' in registry.render()
+
+
+def test_rename_moves_the_recorded_series():
+    registry = MetricsRegistry()
+    metrics = BotMetrics(registry)
+    other = BotMetrics(registry)
+    placeholder = metrics.bot
+
+    metrics.events.inc("READY")
+    metrics.heartbeat_latency.observe(0.1)
+    other.events.inc("READY")
+    metrics.rename("123")
+
+    assert metrics.named
+    assert metrics.events.get("READY") == 1
+    assert metrics.heartbeat_latency.get().count == 1
+    assert metrics.events.metric.get(placeholder, "READY") == 0
+    assert other.events.get("READY") == 1
+
+
+def test_rename_merges_into_existing_series():
+    registry = MetricsRegistry()
+    metrics = BotMetrics(registry)
+    BotMetrics(registry, "123").events.inc("READY", amount=2)
+
+    metrics.events.inc("READY")
+    metrics.rename("123")
+
+    assert metrics.events.get("READY") == 3
+
+
+def test_traces_of_bots_sharing_a_tracer_stay_apart():
+    registry = MetricsRegistry()
+    histograms = HistogramExporter()
+    tracer = Tracer([ histograms, MetricsExporter(registry) ])
+
+    for bot in ("first", "second", "second"):
+        trace = tracer.start(0, time.perf_counter(), 0.0, bot)
+        trace.command = "ping"
+        tracer.finish(trace)
+
+    assert histograms.histograms[("first", "ping")]["total"].count == 1
+    assert histograms.histograms[("second", "ping")]["total"].count == 2
+    latency = registry.get("diskordpie_interaction_latency_seconds")
+    assert latency.get("second", "ping", "total").count == 2
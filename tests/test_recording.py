@@ -0,0 +1,25 @@
+from diskordpie.recording import GatewayRecorder, read_recording
+
+
+def test_recorder_continues_after_existing_segments(tmp_path):
+    prefix = str(tmp_path / "rec")
+    for name in ("rec.0001.dprec", "rec.0003.dprec.gz", "rec.old.0000.dprec", "rec.12x.dprec"):
+        (tmp_path / name).touch()
+
+    recorder = GatewayRecorder(prefix)
+    recorder.write('{"op": 11}')
+    recorder.close()
+
+    assert recorder.files == [ prefix + ".0004.dprec" ]
+
+
+def test_recording_round_trip(tmp_path):
+    prefix = str(tmp_path / "rec")
+    recorder = GatewayRecorder(prefix, max_bytes=1, compress=True)
+    recorder.write('{"op": 10}')
+    recorder.write(b'{"op": 11}')
+    recorder.close()
+
+    assert len(recorder.files) == 2
+    frames = [ frame for _, frame in read_recording(prefix + ".*.dprec*") ]
+    assert frames == [ b'{"op": 10}', b'{"op": 11}' ]
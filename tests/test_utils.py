@@ -0,0 +1,98 @@
+import json
+
+from enum import Enum
+
+import pytest
+
+from diskordpie.commands import Choice, Option, OptionType, SlashCommand, InteractionResponse, InteractionResponseType
+from diskordpie.utils import Field, to_dict
+
+
+class Color(Enum):
+    RED = "red"
+
+
+class Renamed:
+
+    _json_fields = ("name", Field("user_id", key="id"), Field("color", enum=True), Field("tags", nested=True))
+
+    def __init__(self, name=None, user_id=None, color=None, tags=None) -> None:
+        self.name = name
+        self.user_id = user_id
+        self.color = color
+        self.tags = tags
+
+
+def test_none_fields_are_dropped():
+    assert to_dict(Choice("one", None)) == { "name": "one" }
+    assert to_dict(Renamed()) == {}
+
+
+def test_renamed_field_and_enum_values():
+    data = to_dict(Renamed("a", 5, Color.RED, [ Color.RED, OptionType.USER ]))
+
+    assert data == { "name": "a", "id": 5, "color": "red", "tags": [ "red", 6 ] }
+    assert type(data["tags"][1]) is int
+
+
+def test_nested_options_choices_and_channel_types():
+    option = Option(
+        type=OptionType.SUB_COMMAND,
+        name="sub",
+        description="d",
+        options=[ Option(type=OptionType.STRING, name="s", description="d", choices=[ Choice("a", "1") ]) ],
+        channel_types=( 0, 5 ),
+    )
+
+    assert to_dict(option) == {
+        "type": 1,
+        "name": "sub",
+        "description": "d",
+        "options": [ { "type": 3, "name": "s", "description": "d", "choices": [ { "name": "a", "value": "1" } ] } ],
+        "channel_types": [ 0, 5 ],
+    }
+
+
+def test_dicts_are_copied_with_their_values_encoded():
+    response = InteractionResponse(InteractionResponseType.CHANNEL_MESSAGE_WITH_SOURCE, { "content": "hi" })
+    payload = { "d": response, "op": OptionType.STRING }
+
+    assert to_dict(payload) == { "d": { "type": 4, "data": { "content": "hi" } }, "op": 3 }
+
+
+def test_unsupported_types_raise():
+    with pytest.raises(TypeError):
+        to_dict({ "when": object() })
+
+
+def test_slash_command_matches_the_hand_built_payload():
+    async def roll(interaction, sides: int, label: str = "d"):
+        ...
+
+    cmd = SlashCommand(roll, description="Rolls a die.", options={
+        "sides": Option.Range(1, 100),
+        "label": Option(choices=[ Choice("dice", "d") ], autocomplete=False),
+    })
+
+    # what create_slash_command used to send, written out by hand
+    expected = {
+        "name": cmd.name,
+        "description": cmd.description,
+        "options": [ {
+            "type": opt.type,
+            "name": opt.name,
+            "description": opt.description,
+            "required": opt.required,
+            "min_value": opt.min_value,
+            "max_value": opt.max_value,
+        } for opt in cmd.options ],
+    }
+    # None is left out now, and the fields it never sent are included
+    for opt_data in expected["options"]:
+        for key in [ key for key, value in opt_data.items() if value is None ]:
+            del opt_data[key]
+    expected["options"][1].update(choices=[ { "name": "dice", "value": "d" } ], autocomplete=False)
+
+    data = to_dict(cmd)
+    assert data == expected
+    assert json.loads(json.dumps(data)) == json.loads(json.dumps(expected))